@@ -1,10 +1,12 @@
-from django.contrib import admin
-from .models import CustomUser, MenuItem, Order
+from django.contrib import admin, messages
+from .models import CustomUser, MenuItem, Order, OrderArchive
 
 from django import forms
+from django.db import transaction
 from django.utils.html import format_html
 from .models import MenuItem, DeliveryStatus
 from cloudinary.forms import CloudinaryFileField
+from . import lifecycle, order_status
 
 
 @admin.register(CustomUser)
@@ -26,6 +28,38 @@ class OrderAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        if 'status' in form.changed_data:
+            # Also covers list_editable saves: the status goes through the checked conditional update
+            try:
+                order = order_status.change_status(obj.pk, obj.status, expected_status=form.initial['status'])
+                obj.version = order.version
+            except order_status.StatusConflict as e:
+                self.message_user(request, e.message, messages.ERROR)
+                obj.status = form.initial['status']
+        # Never a full-row save: it would write back the status and version this form was loaded with
+        other_fields = [
+            name for name in form.changed_data if name not in ('status', 'version') and name in self.concrete_fields
+        ]
+        if other_fields:
+            obj.save(update_fields=other_fields)
+
+    @property
+    def concrete_fields(self):
+        return {field.name for field in Order._meta.concrete_fields}
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            lifecycle.orders_deleted([obj])
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            lifecycle.orders_deleted(list(queryset))
+            super().delete_queryset(request, queryset)
+
 # Removed duplicate registrations: admin.site.register(CustomUser, CustomUserAdmin), etc.
 # The @admin.register decorators handle registration automatically.
 
@@ -98,4 +132,16 @@ class DeliveryStatusAdmin(admin.ModelAdmin):
         return not DeliveryStatus.objects.exists()
     
     def has_delete_permission(self, request, obj=None):
-        return False
\ No newline at end of file
+        return False
+
+@admin.register(OrderArchive)
+class OrderArchiveAdmin(admin.ModelAdmin):
+    list_display = ['order_id', 'user_id', 'status', 'total_price', 'created_at', 'archived_at']
+    list_filter = ['status']
+    search_fields = ['order_id', 'user_id']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
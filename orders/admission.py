@@ -0,0 +1,105 @@
+"""
+Kitchen-capacity admission control for new orders.
+
+The load is the kitchen board's outstanding order and unit totals
+(kitchen.load(), two counters in the shared cache) plus reservations for
+orders that have been admitted but not committed yet. Admitting an order
+increments the reservations first and checks afterwards, so two workers
+racing for the last slot can't both get it. The reservation is released
+once the order has been written; by then the kitchen counters include it.
+
+When the load reaches ADMISSION_MAX_ORDERS or ADMISSION_MAX_UNITS,
+DeliveryStatus is switched off and new orders get a 503 with Retry-After.
+It's switched back on, and orders admitted again, only once the load
+falls to ADMISSION_RESUME_RATIO of both caps, so it doesn't flap around
+the limit. A closure made by hand is never reopened automatically.
+"""
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import kitchen
+from .models import DeliveryStatus
+
+RESERVED_ORDERS_KEY = 'admission:reserved_orders'
+RESERVED_UNITS_KEY = 'admission:reserved_units'
+CLOSED_KEY = 'admission:closed'  # Set while DeliveryStatus is off because of load
+
+
+class KitchenBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The kitchen is at capacity, please try again shortly'
+    default_code = 'kitchen_busy'
+
+    def __init__(self):
+        super().__init__({'error': self.default_detail})
+        self.wait = settings.ADMISSION_RETRY_AFTER  # DRF turns this into a Retry-After header
+
+
+def _enabled():
+    return settings.ADMISSION_MAX_ORDERS > 0 or settings.ADMISSION_MAX_UNITS > 0
+
+
+def _over(orders, units, ratio=1.0):
+    return (
+        (settings.ADMISSION_MAX_ORDERS > 0 and orders > settings.ADMISSION_MAX_ORDERS * ratio)
+        or (settings.ADMISSION_MAX_UNITS > 0 and units > settings.ADMISSION_MAX_UNITS * ratio)
+    )
+
+
+def _incr(key, n):
+    cache.add(key, 0, timeout=None)
+    return cache.incr(key, n)
+
+
+@contextmanager
+def admit(units):
+    """Hold a slot for one order of `units` while the body writes it; raises KitchenBusy when full"""
+    if not _enabled():
+        yield
+        return
+    reserved_orders = _incr(RESERVED_ORDERS_KEY, 1)
+    reserved_units = _incr(RESERVED_UNITS_KEY, units)
+    try:
+        if cache.get(CLOSED_KEY):
+            raise KitchenBusy()
+        orders, outstanding_units = kitchen.load()
+        if _over(orders + reserved_orders, outstanding_units + reserved_units):
+            raise KitchenBusy()
+        yield
+    finally:
+        cache.decr(RESERVED_ORDERS_KEY, 1)
+        cache.decr(RESERVED_UNITS_KEY, units)
+
+
+def update_delivery_status():
+    """Switch DeliveryStatus off at the caps and back on at the resume ratio"""
+    if not _enabled():
+        return
+    orders, units = kitchen.load()
+    if cache.get(CLOSED_KEY):
+        if not _over(orders, units, settings.ADMISSION_RESUME_RATIO):
+            cache.delete(CLOSED_KEY)
+            _set_available(True)
+    # At the cap counts as full: the next order would go over it
+    elif _over(orders + 1, units + 1):
+        delivery_status = DeliveryStatus.get_status()
+        if delivery_status.available and cache.add(CLOSED_KEY, True, timeout=None):
+            delivery_status.available = False
+            delivery_status.save()
+
+
+def _set_available(available):
+    delivery_status = DeliveryStatus.get_status()
+    if delivery_status.available != available:
+        delivery_status.available = available
+        delivery_status.save()
+
+
+def delivery_status_saved(delivery_status):
+    # Someone reopened deliveries by hand; stop holding orders back for the automatic closure
+    if delivery_status.available:
+        cache.delete(CLOSED_KEY)
@@ -0,0 +1,166 @@
+"""
+Sales rollups behind /api/admin/analytics/.
+
+HourlySales and DailyItemSales are updated incrementally as orders are
+created, change status or are deleted (see lifecycle.py), using set-based
+INSERT ... ON CONFLICT DO UPDATE increments. Reports therefore read a few
+rows per day in range instead of scanning Order. The rebuild_sales_rollups
+command recomputes them from history.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import DailyItemSales, HourlySales, OrderLine
+
+CANCELLED = 'CANCELLED'
+CENT = Decimal('0.01')
+
+
+def hour_bucket(moment):
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def increment(model, key_fields, value_fields, rows):
+    """
+    Add `rows` ({key tuple: value tuple}) onto `model` in one upsert statement.
+
+    INSERT ... ON CONFLICT (keys) DO UPDATE SET v = v + excluded.v is valid
+    on both PostgreSQL and SQLite.
+    """
+    rows = {key: values for key, values in rows.items() if any(values)}
+    if not rows:
+        return
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    fields = [model._meta.get_field(name) for name in key_fields + value_fields]
+    columns = [qn(field.column) for field in fields]
+    key_columns = columns[:len(key_fields)]
+    value_columns = columns[len(key_fields):]
+    row_sql = '(' + ', '.join(['%s'] * len(fields)) + ')'
+    sql = (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES {', '.join([row_sql] * len(rows))} "
+        f"ON CONFLICT ({', '.join(key_columns)}) DO UPDATE SET "
+        + ', '.join(f'{column} = {table}.{column} + excluded.{column}' for column in value_columns)
+    )
+    params = [
+        field.get_db_prep_value(value, connection)
+        for key, values in rows.items()
+        for field, value in zip(fields, key + values)
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+
+
+def _item_rows(orders, sign):
+    by_id = {order.id: order for order in orders}
+    rows = defaultdict(lambda: [0, Decimal('0')])
+    lines = OrderLine.objects.filter(order_id__in=by_id).values_list('order_id', 'menu_item_id', 'quantity', 'unit_price')
+    for order_id, menu_item_id, quantity, unit_price in lines:
+        row = rows[(timezone.localdate(by_id[order_id].created_at), menu_item_id)]
+        row[0] += sign * quantity
+        row[1] += sign * quantity * unit_price
+    return {key: tuple(values) for key, values in rows.items()}
+
+
+def record_orders_created(orders, sign=1):
+    hourly = defaultdict(lambda: [0, Decimal('0')])
+    for order in orders:
+        row = hourly[(hour_bucket(order.created_at), order.status)]
+        row[0] += sign
+        row[1] += sign * order.total_price
+    increment(HourlySales, ['hour', 'status'], ['orders', 'revenue'], {k: tuple(v) for k, v in hourly.items()})
+    live = [order for order in orders if order.status != CANCELLED]
+    if live:
+        increment(DailyItemSales, ['day', 'menu_item'], ['units', 'revenue'], _item_rows(live, sign))
+
+
+def record_orders_deleted(orders):
+    """Take deleted orders back out; call before the delete cascades their lines away"""
+    record_orders_created(orders, sign=-1)
+
+
+def record_status_changes(changes):
+    """Move orders between status buckets; `changes` is [(order, previous_status)]"""
+    hourly = defaultdict(lambda: [0, Decimal('0')])
+    cancelled, restored = [], []
+    for order, previous in changes:
+        if previous == order.status:
+            continue
+        hour = hour_bucket(order.created_at)
+        for status, sign in ((previous, -1), (order.status, 1)):
+            row = hourly[(hour, status)]
+            row[0] += sign
+            row[1] += sign * order.total_price
+        if order.status == CANCELLED:
+            cancelled.append(order)
+        elif previous == CANCELLED:
+            restored.append(order)
+    increment(HourlySales, ['hour', 'status'], ['orders', 'revenue'], {k: tuple(v) for k, v in hourly.items()})
+    if cancelled:
+        increment(DailyItemSales, ['day', 'menu_item'], ['units', 'revenue'], _item_rows(cancelled, -1))
+    if restored:
+        increment(DailyItemSales, ['day', 'menu_item'], ['units', 'revenue'], _item_rows(restored, 1))
+
+
+def sales_report(start, end, top=10):
+    """Aggregate the rollups for the local dates start..end inclusive"""
+    since = timezone.make_aware(datetime.combine(start, time.min))
+    until = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min))
+    # Buckets emptied by cancellations or deletes stay behind as zero rows
+    hours = HourlySales.objects.filter(hour__gte=since, hour__lt=until).exclude(orders=0)
+
+    by_hour = defaultdict(lambda: {'orders': 0, 'revenue': Decimal('0')})
+    by_day = defaultdict(lambda: {'orders': 0, 'revenue': Decimal('0')})
+    by_status = defaultdict(int)
+    for hour, status, orders, revenue in hours.values_list('hour', 'status', 'orders', 'revenue'):
+        by_status[status] += orders
+        if status == CANCELLED:
+            continue
+        local = timezone.localtime(hour)
+        for bucket in (by_hour[local], by_day[local.date()]):
+            bucket['orders'] += orders
+            bucket['revenue'] += revenue
+
+    items = (
+        DailyItemSales.objects.filter(day__gte=start, day__lte=end)
+        .values('menu_item_id', 'menu_item__name')
+        .annotate(total_units=Sum('units'), total_revenue=Sum('revenue'))
+        .filter(total_units__gt=0)
+    )
+
+    def top_items(order_by):
+        return [
+            {
+                'id': row['menu_item_id'],
+                'name': row['menu_item__name'],
+                'units': row['total_units'],
+                'revenue': _money(row['total_revenue']),
+            }
+            for row in items.order_by(f'-{order_by}', 'menu_item_id')[:top]
+        ]
+
+    return {
+        'from': start,
+        'to': end,
+        'revenue_by_day': [
+            {'day': day, 'orders': totals['orders'], 'revenue': _money(totals['revenue'])}
+            for day, totals in sorted(by_day.items())
+        ],
+        'revenue_by_hour': [
+            {'hour': hour, 'orders': totals['orders'], 'revenue': _money(totals['revenue'])}
+            for hour, totals in sorted(by_hour.items())
+        ],
+        'orders_by_status': dict(by_status),
+        'top_items_by_units': top_items('total_units'),
+        'top_items_by_revenue': top_items('total_revenue'),
+    }
+
+
+def _money(value):
+    # Strings, like the DecimalFields elsewhere in the API
+    return str(Decimal(value).quantize(CENT))
@@ -0,0 +1,105 @@
+"""
+Drop-in replacement for DRF's TokenAuthentication that caches token lookups.
+
+Lookups go through a per-process LRU first, then (optionally) the shared
+Django cache named by TOKEN_AUTH_SHARED_CACHE, and only then the database.
+
+Every token has a version stamp in the default cache, and each cached entry
+remembers the stamp it was loaded under. signals.py publishes a new stamp
+when a token is deleted or its user is saved (deactivation, admin-flag
+changes), so every worker drops its copy on the next request instead of
+waiting for TOKEN_AUTH_CACHE_TTL. Like delivery_status_cache, this reaches
+other workers only when the default cache is shared (Redis).
+"""
+import copy
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from .local_cache import LocalLRUCache
+
+SHARED_KEY = 'auth:token:v2:{digest}'  # Entries are (user, token, stamp)
+VERSION_KEY = 'auth:token-version:{digest}'
+
+local_tokens = LocalLRUCache(settings.TOKEN_AUTH_CACHE_SIZE, settings.TOKEN_AUTH_CACHE_TTL)
+shared_stats = {'hits': 0, 'misses': 0}
+
+
+def _shared_cache():
+    alias = settings.TOKEN_AUTH_SHARED_CACHE
+    return caches[alias] if alias else None
+
+
+def _digest(key):
+    # Never use the raw token as a cache key
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _shared_key(key):
+    return SHARED_KEY.format(digest=_digest(key))
+
+
+def _version_key(key):
+    return VERSION_KEY.format(digest=_digest(key))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        # Read the stamp before any lookup: if an invalidation lands while we load
+        # from the DB, the entry is stored under the old stamp and dropped next time
+        stamp = cache.get(_version_key(key))
+        entry = local_tokens.get(key)
+        if entry is None or entry[2] != stamp:
+            shared = _shared_cache()
+            entry = None
+            if shared is not None:
+                entry = shared.get(_shared_key(key))
+                if entry is not None and entry[2] != stamp:
+                    entry = None
+                shared_stats['hits' if entry is not None else 'misses'] += 1
+            if entry is None:
+                # Raises AuthenticationFailed for unknown keys and inactive users
+                entry = super().authenticate_credentials(key) + (stamp,)
+                if shared is not None:
+                    shared.set(_shared_key(key), entry, settings.TOKEN_AUTH_SHARED_TTL)
+            local_tokens.set(key, entry)
+        user, token, _ = entry
+        # Hand each request its own copy so nothing leaks between requests through the cache
+        return copy.copy(user), token
+
+
+def invalidate_token(key):
+    invalidate_tokens([key])
+
+
+def invalidate_user_tokens(user_id):
+    local_tokens.delete_where(lambda entry: entry[0].pk == user_id)
+    invalidate_tokens(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+
+
+def invalidate_tokens(keys):
+    """Publish new stamps so every worker drops these tokens; call after the write commits"""
+    keys = list(keys)
+    for key in keys:
+        local_tokens.delete(key)
+    # Outlive every entry cached under the old stamp, or a lapsed stamp would make them current again
+    timeout = max(settings.TOKEN_AUTH_CACHE_TTL, settings.TOKEN_AUTH_SHARED_TTL) + 60
+    stamp = uuid.uuid4().hex
+    cache.set_many({_version_key(key): stamp for key in keys}, timeout)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete_many([_shared_key(key) for key in keys])
+
+
+def token_cache_stats():
+    return {
+        'local_hits': local_tokens.hits,
+        'local_misses': local_tokens.misses,
+        'local_size': len(local_tokens),
+        'shared_hits': shared_stats['hits'],
+        'shared_misses': shared_stats['misses'],
+    }
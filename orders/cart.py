@@ -0,0 +1,85 @@
+"""
+Server-side cart operations on CartItem.
+
+Writes are single set-based statements (UPDATE ... quantity + n, INSERT ...
+ON CONFLICT DO UPDATE, DELETE) rather than per-row get/save, and totals are
+priced from the cached menu price table instead of loading each item.
+A line never holds more than MAX_QUANTITY; repeated adds stop there.
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Least
+
+from .menu_cache import get_price_table
+from .models import CartItem
+
+MAX_QUANTITY = 99
+
+
+def add_to_cart(user, item_id, quantity):
+    """Add `quantity` of an item, incrementing it in place (up to MAX_QUANTITY) if it's already in the cart"""
+    line = CartItem.objects.filter(user=user, item_id=item_id)
+    capped = Least(F('quantity') + quantity, MAX_QUANTITY)
+    if not line.update(quantity=capped):
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(user=user, item_id=item_id, quantity=min(quantity, MAX_QUANTITY))
+        except IntegrityError:
+            # A concurrent add created the row first; increment that one
+            line.update(quantity=capped)
+
+
+def set_quantities(user, quantities):
+    """Upsert {item_id: quantity} in one statement; a quantity of 0 removes the item"""
+    keep = {item_id: quantity for item_id, quantity in quantities.items() if quantity > 0}
+    drop = [item_id for item_id, quantity in quantities.items() if quantity <= 0]
+    with transaction.atomic():
+        if keep:
+            CartItem.objects.bulk_create(
+                [CartItem(user=user, item_id=item_id, quantity=quantity) for item_id, quantity in keep.items()],
+                update_conflicts=True,
+                unique_fields=['user', 'item'],
+                update_fields=['quantity'],
+            )
+        if drop:
+            CartItem.objects.filter(user=user, item_id__in=drop).delete()
+
+
+def sync_cart(user, quantities):
+    """Replace the whole cart with {item_id: quantity}: one upsert plus one delete"""
+    with transaction.atomic():
+        set_quantities(user, quantities)
+        CartItem.objects.filter(user=user).exclude(
+            item_id__in=[item_id for item_id, quantity in quantities.items() if quantity > 0]
+        ).delete()
+
+
+def remove_from_cart(user, item_id):
+    CartItem.objects.filter(user=user, item_id=item_id).delete()
+
+
+def clear_cart(user):
+    CartItem.objects.filter(user=user).delete()
+
+
+def cart_summary(user):
+    """Cart lines and subtotal, priced from the cached price table (one query)"""
+    prices = get_price_table()
+    lines = []
+    subtotal = Decimal('0.00')
+    for item_id, quantity in CartItem.objects.filter(user=user).order_by('id').values_list('item_id', 'quantity'):
+        if item_id not in prices:
+            continue  # Added in the instant before the menu version bump lands
+        price, name = prices[item_id]
+        line_total = price * quantity
+        subtotal += line_total
+        lines.append({
+            'item_id': item_id,
+            'name': name,
+            'quantity': quantity,
+            'unit_price': price,
+            'line_total': line_total,
+        })
+    return {'items': lines, 'subtotal': subtotal}
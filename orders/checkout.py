@@ -0,0 +1,110 @@
+"""
+Server-side order pricing and the cart-to-order checkout pipeline.
+
+Prices always come from the cached menu price table; whatever totals or
+unit prices the client sends are ignored.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Sum
+
+from . import admission, delivery, inventory, lifecycle
+from .menu_cache import get_price_table
+from .models import CartItem, CustomUser, MenuItem, Order, OrderLine
+
+class CheckoutError(Exception):
+    pass
+
+
+def delivery_charge(latitude, longitude):
+    try:
+        return delivery.delivery_charge(latitude, longitude)
+    except delivery.DeliveryError as e:
+        raise CheckoutError(str(e))
+
+
+def price_lines(quantities):
+    """
+    Price {item_id: quantity} from the price table.
+
+    Returns (items_data, subtotal) with items_data in the shape stored on
+    Order.items_data; raises CheckoutError for ids that aren't on the menu.
+    """
+    prices = get_price_table()
+    unknown = [item_id for item_id in quantities if item_id not in prices]
+    if unknown:
+        raise CheckoutError(f"Unknown menu items: {', '.join(map(str, sorted(unknown)))}")
+    items_data = []
+    subtotal = Decimal('0.00')
+    for item_id, quantity in quantities.items():
+        price, name = prices[item_id]
+        subtotal += price * quantity
+        items_data.append({'id': item_id, 'name': name, 'quantity': quantity, 'price': str(price)})
+    return items_data, subtotal
+
+
+def quantities_from_items_data(items_data):
+    """Collapse client items_data into {item_id: quantity}, ignoring any client prices"""
+    quantities = {}
+    for entry in items_data or []:
+        try:
+            item_id, quantity = int(entry['id']), int(entry.get('quantity') or 1)
+        except (KeyError, TypeError, ValueError):
+            raise CheckoutError('Each items_data entry needs an integer id and quantity')
+        if quantity < 1:
+            raise CheckoutError('Quantities must be at least 1')
+        quantities[item_id] = quantities.get(item_id, 0) + quantity
+    return quantities
+
+
+def take_stock(quantities):
+    """inventory.take() for an order being placed; call inside its transaction"""
+    try:
+        inventory.take(quantities)
+    except inventory.OutOfStock as e:
+        prices = get_price_table()
+        names = [prices[item_id][1] if item_id in prices else str(item_id) for item_id in e.item_ids]
+        raise CheckoutError(f"Sold out: {', '.join(names)}")
+
+
+def checkout_cart(user, **order_fields):
+    """
+    Turn the user's cart into an Order in one transaction and clear the cart.
+
+    The user row is locked first, so parallel submits for the same user run
+    one after the other and the later one finds an empty cart. The query
+    count doesn't depend on the number of cart lines. Raises
+    admission.KitchenBusy when the kitchen is at capacity.
+    """
+    units = CartItem.objects.filter(user=user).aggregate(units=Sum('quantity'))['units'] or 0
+    with admission.admit(units), transaction.atomic():
+        CustomUser.objects.select_for_update().filter(pk=user.pk).first()
+        quantities = dict(CartItem.objects.filter(user=user).values_list('item_id', 'quantity'))
+        if not quantities:
+            raise CheckoutError('Cart is empty')
+        # One query confirms every item still exists; prices come from the cached table
+        existing = set(MenuItem.objects.filter(id__in=quantities).values_list('id', flat=True))
+        if existing != set(quantities):
+            raise CheckoutError('Some cart items are no longer on the menu')
+        items_data, subtotal = price_lines(quantities)
+        charge = delivery_charge(order_fields.get('latitude'), order_fields.get('longitude'))
+        take_stock(quantities)
+
+        order = Order.objects.create(
+            user=user,
+            total_price=subtotal + charge,
+            delivery_charge=charge,
+            items_data=items_data,
+            **order_fields,
+        )
+        Order.items.through.objects.bulk_create([
+            Order.items.through(order_id=order.id, menuitem_id=item_id) for item_id in quantities
+        ])
+        OrderLine.objects.bulk_create([
+            OrderLine(order=order, menu_item_id=entry['id'], quantity=entry['quantity'], unit_price=Decimal(entry['price']))
+            for entry in items_data
+        ])
+        CartItem.objects.filter(user=user).delete()
+        lifecycle.orders_created([order])
+    return order
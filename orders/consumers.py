@@ -0,0 +1,28 @@
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .events import ADMIN_GROUP, user_group
+
+
+class OrderUpdateConsumer(AsyncJsonWebsocketConsumer):
+    """
+    Pushes order create / status-change events to connected clients.
+
+    Admins get every order; customers only get their own. Messages look like
+    {"event": "order.status_changed", "orders": [{"id": 1, "status": "ACCEPTED", ...}]}
+    """
+
+    async def connect(self):
+        user = self.scope.get('user')
+        if user is None or not user.is_authenticated:
+            await self.close(code=4401)
+            return
+        self.group = ADMIN_GROUP if user.is_staff else user_group(user.id)
+        await self.channel_layer.group_add(self.group, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group'):
+            await self.channel_layer.group_discard(self.group, self.channel_name)
+
+    async def order_events(self, message):
+        await self.send_json({'event': message['event'], 'orders': message['orders']})
@@ -0,0 +1,205 @@
+"""
+Delivery pricing: distance from the restaurant, tiered charges and the
+delivery zone.
+
+Settings (see settings.py):
+    RESTAURANT_LATITUDE / RESTAURANT_LONGITUDE
+    DELIVERY_TIERS   "max_km:charge,..." e.g. "3:50,6:80,10:120"; beyond the
+                     last tier is out of range
+    DELIVERY_ZONE    optional polygon "lat,lng;lat,lng;..." the address must
+                     also fall inside
+
+Zone checks go through DeliveryZone, which precomputes a bounding box and a
+grid over the polygon. Most points resolve from their grid cell alone; only
+points in cells an edge passes through fall back to ray casting, and then
+only against the edges that span that grid row.
+"""
+import math
+from bisect import bisect_left
+from decimal import Decimal
+from functools import lru_cache
+
+from django.conf import settings
+
+EARTH_RADIUS_KM = 6371.0088
+GRID_SIZE = 32
+
+OUTSIDE, INSIDE, EDGE = 0, 1, 2
+
+
+class DeliveryError(Exception):
+    pass
+
+
+class DeliveryZone:
+    """Point-in-polygon over (lat, lng) vertices with a bbox + grid index"""
+
+    def __init__(self, vertices, grid_size=GRID_SIZE):
+        if len(vertices) < 3:
+            raise ValueError('A delivery zone needs at least 3 vertices')
+        # x = longitude, y = latitude; planar is fine at city scale
+        points = [(float(lng), float(lat)) for lat, lng in vertices]
+        self.edges = [(points[i], points[(i + 1) % len(points)]) for i in range(len(points))]
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        self.min_x, self.max_x, self.min_y, self.max_y = min(xs), max(xs), min(ys), max(ys)
+        self.size = grid_size
+        self.cell_w = (self.max_x - self.min_x) / grid_size or 1e-12
+        self.cell_h = (self.max_y - self.min_y) / grid_size or 1e-12
+
+        # Edges overlapping each grid row, for the ray cast fallback
+        self.row_edges = [[] for _ in range(grid_size)]
+        touched = set()
+        for edge in self.edges:
+            (x1, y1), (x2, y2) = edge
+            col_lo, col_hi = self._col(min(x1, x2)), self._col(max(x1, x2))
+            row_lo, row_hi = self._row(min(y1, y2)), self._row(max(y1, y2))
+            for row in range(row_lo, row_hi + 1):
+                self.row_edges[row].append(edge)
+                for col in range(col_lo, col_hi + 1):
+                    touched.add((row, col))
+
+        # Cells no edge passes through are entirely inside or outside; their centre decides
+        self.cells = []
+        for row in range(grid_size):
+            cy = self.min_y + (row + 0.5) * self.cell_h
+            line = bytearray(grid_size)
+            for col in range(grid_size):
+                if (row, col) in touched:
+                    line[col] = EDGE
+                else:
+                    cx = self.min_x + (col + 0.5) * self.cell_w
+                    line[col] = INSIDE if self._ray_cast(cx, cy, self.edges) else OUTSIDE
+            self.cells.append(bytes(line))
+
+    @classmethod
+    def parse(cls, value):
+        vertices = []
+        for pair in value.split(';'):
+            if pair.strip():
+                lat, lng = pair.split(',')
+                vertices.append((float(lat), float(lng)))
+        return cls(vertices)
+
+    def _col(self, x):
+        return min(max(int((x - self.min_x) / self.cell_w), 0), self.size - 1)
+
+    def _row(self, y):
+        return min(max(int((y - self.min_y) / self.cell_h), 0), self.size - 1)
+
+    @staticmethod
+    def _ray_cast(x, y, edges):
+        inside = False
+        for (x1, y1), (x2, y2) in edges:
+            if (y1 > y) != (y2 > y) and x < (x2 - x1) * (y - y1) / (y2 - y1) + x1:
+                inside = not inside
+        return inside
+
+    def contains(self, lat, lng):
+        x, y = float(lng), float(lat)
+        if x < self.min_x or x > self.max_x or y < self.min_y or y > self.max_y:
+            return False
+        row = self._row(y)
+        cell = self.cells[row][self._col(x)]
+        if cell != EDGE:
+            return cell == INSIDE
+        return self._ray_cast(x, y, self.row_edges[row])
+
+
+class DeliveryPricing:
+    def __init__(self, origin, tiers, zone=None):
+        self.origin_lat = math.radians(origin[0])
+        self.origin_lng = math.radians(origin[1])
+        self.cos_origin = math.cos(self.origin_lat)
+        self.tiers = sorted(tiers)
+        self.limits = [limit for limit, _ in self.tiers]
+        self.zone = zone
+
+    @property
+    def base_charge(self):
+        return self.tiers[0][1]
+
+    def distance_km(self, lat, lng):
+        """Haversine distance from the restaurant"""
+        lat, lng = math.radians(float(lat)), math.radians(float(lng))
+        a = (
+            math.sin((lat - self.origin_lat) / 2) ** 2
+            + self.cos_origin * math.cos(lat) * math.sin((lng - self.origin_lng) / 2) ** 2
+        )
+        return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+    def quote(self, lat, lng):
+        distance = self.distance_km(lat, lng)
+        tier = bisect_left(self.limits, distance)
+        in_zone = self.zone is None or self.zone.contains(lat, lng)
+        deliverable = in_zone and tier < len(self.tiers)
+        return {
+            'distance_km': round(distance, 2),
+            'deliverable': deliverable,
+            'delivery_charge': self.tiers[tier][1] if deliverable else None,
+        }
+
+    def quote_many(self, points):
+        """Quote [(lat, lng), ...] in one pass with the per-call setup hoisted out"""
+        sin, cos, asin, sqrt, radians = math.sin, math.cos, math.asin, math.sqrt, math.radians
+        origin_lat, origin_lng, cos_origin = self.origin_lat, self.origin_lng, self.cos_origin
+        limits, tiers, zone, last = self.limits, self.tiers, self.zone, len(self.tiers)
+        quotes = []
+        for lat, lng in points:
+            phi, lam = radians(float(lat)), radians(float(lng))
+            a = sin((phi - origin_lat) / 2) ** 2 + cos_origin * cos(phi) * sin((lam - origin_lng) / 2) ** 2
+            distance = 2 * EARTH_RADIUS_KM * asin(sqrt(a))
+            tier = bisect_left(limits, distance)
+            deliverable = tier < last and (zone is None or zone.contains(lat, lng))
+            quotes.append({
+                'distance_km': round(distance, 2),
+                'deliverable': deliverable,
+                'delivery_charge': tiers[tier][1] if deliverable else None,
+            })
+        return quotes
+
+
+def _parse_tiers(value):
+    tiers = []
+    for part in value.split(','):
+        if part.strip():
+            limit, charge = part.split(':')
+            tiers.append((float(limit), Decimal(charge.strip()).quantize(Decimal('0.01'))))
+    if not tiers:
+        raise ValueError('DELIVERY_TIERS needs at least one tier')
+    return tiers
+
+
+@lru_cache(maxsize=4)
+def _build(latitude, longitude, tiers, zone):
+    return DeliveryPricing(
+        (float(latitude), float(longitude)),
+        _parse_tiers(tiers),
+        DeliveryZone.parse(zone) if zone.strip() else None,
+    )
+
+
+def get_pricing():
+    """The configured pricing engine, built once per distinct configuration"""
+    return _build(
+        settings.RESTAURANT_LATITUDE,
+        settings.RESTAURANT_LONGITUDE,
+        settings.DELIVERY_TIERS,
+        settings.DELIVERY_ZONE,
+    )
+
+
+def delivery_charge(latitude, longitude):
+    """
+    Charge for delivering to an order's coordinates.
+
+    Orders without coordinates pay the first tier, as they always have;
+    raises DeliveryError for addresses outside the zone or the last tier.
+    """
+    pricing = get_pricing()
+    if latitude is None or longitude is None:
+        return pricing.base_charge
+    quote = pricing.quote(latitude, longitude)
+    if not quote['deliverable']:
+        raise DeliveryError(f"We don't deliver to this address ({quote['distance_km']} km away)")
+    return quote['delivery_charge']
@@ -0,0 +1,45 @@
+"""
+Process-local cache of the DeliveryStatus singleton.
+
+Each worker keeps the serialized status next to the version stamp it was
+loaded at. The current stamp lives in the shared cache; a write publishes a
+new stamp on commit (see signals.py) and every worker reloads once it sees
+a stamp that differs from its own. At steady state reads never hit the DB.
+"""
+from django.core.cache import cache
+
+from .models import DeliveryStatus
+from .serializers import DeliveryStatusSerializer
+
+VERSION_KEY = 'delivery_status:version'
+
+_local = None  # (version, payload)
+
+
+def status_version(status):
+    return int(status.updated_at.timestamp() * 1_000_000)
+
+
+def get_delivery_status():
+    """Return {'version', 'data', 'updated_at'} for the current delivery status"""
+    global _local
+    version = cache.get(VERSION_KEY)
+    local = _local
+    if local is not None and version is not None and local['version'] == version:
+        return local
+
+    status = DeliveryStatus.get_status()
+    local = {
+        'version': status_version(status),
+        'data': DeliveryStatusSerializer(status).data,
+        'updated_at': status.updated_at,
+    }
+    # add(), never set(): a reader holding an old row must not overwrite a newer stamp
+    cache.add(VERSION_KEY, local['version'], timeout=None)
+    _local = local
+    return local
+
+
+def publish_delivery_status(status):
+    """Make every worker drop its copy; called after the write commits"""
+    cache.set(VERSION_KEY, status_version(status), timeout=None)
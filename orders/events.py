@@ -0,0 +1,64 @@
+"""
+Order change events pushed to WebSocket clients (see consumers.py).
+
+Admins are subscribed to ADMIN_GROUP and receive every event; each customer
+is subscribed to their own user group. Events are sent after the surrounding
+transaction commits, and a batch of orders goes out as one message per group.
+"""
+import json
+import logging
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+ADMIN_GROUP = 'orders.admin'
+
+ORDER_CREATED = 'order.created'
+ORDER_STATUS_CHANGED = 'order.status_changed'
+
+
+def user_group(user_id):
+    return f'orders.user.{user_id}'
+
+
+def order_payload(order):
+    # Round-trip through the JSON encoder so Decimals and datetimes survive msgpack
+    return json.loads(json.dumps({
+        'id': order.id,
+        'user': order.user_id,
+        'status': order.status,
+        'total_price': order.total_price,
+        'created_at': order.created_at,
+    }, cls=DjangoJSONEncoder))
+
+
+def publish_order_events(event, orders):
+    """Queue `event` for `orders`; delivered on commit, one message per group"""
+    payloads = [order_payload(order) for order in orders]
+    if payloads:
+        transaction.on_commit(lambda: send_order_events(event, payloads))
+
+
+def send_order_events(event, payloads):
+    layer = get_channel_layer()
+    if layer is None:
+        return
+    by_group = defaultdict(list)
+    for payload in payloads:
+        by_group[ADMIN_GROUP].append(payload)
+        by_group[user_group(payload['user'])].append(payload)
+    try:
+        for group, group_payloads in by_group.items():
+            async_to_sync(layer.group_send)(group, {
+                'type': 'order.events',
+                'event': event,
+                'orders': group_payloads,
+            })
+    except Exception:
+        # A down channel layer must never fail the request that changed the order
+        logger.exception('Could not publish %s for %d orders', event, len(payloads))
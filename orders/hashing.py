@@ -0,0 +1,50 @@
+"""
+Bounded executor for password hashing.
+
+PBKDF2 is deliberately slow. Running it here instead of on the request thread
+caps how many hashes run at once (AUTH_HASH_CONCURRENCY), so a burst of
+logins can't starve the rest of the API. A caller waits at most
+AUTH_HASH_QUEUE_TIMEOUT for its result and then gets HashQueueTimeout; its
+job is dropped if it hasn't started by then.
+
+Jobs may use the database (authenticate() does); each one runs between
+close_old_connections() calls, as a request would, so the pool threads
+don't hold on to stale connections.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor = ThreadPoolExecutor(
+    max_workers=settings.AUTH_HASH_CONCURRENCY,
+    thread_name_prefix='auth-hash',
+)
+
+
+class HashQueueTimeout(Exception):
+    pass
+
+
+async def run_hasher(func, *args, **kwargs):
+    """Run `func(*args, **kwargs)` on the hashing pool, waiting no longer than AUTH_HASH_QUEUE_TIMEOUT"""
+    timeout = settings.AUTH_HASH_QUEUE_TIMEOUT
+    enqueued = time.monotonic()
+
+    def job():
+        if time.monotonic() - enqueued > timeout:
+            raise HashQueueTimeout  # The caller has given up already
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    future = _executor.submit(job)
+    try:
+        return await asyncio.wait_for(asyncio.wrap_future(future), max(timeout, 0))
+    except asyncio.TimeoutError:
+        future.cancel()  # Only succeeds while it's still queued; a running job finishes unobserved
+        raise HashQueueTimeout
@@ -0,0 +1,106 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+The first request with a given key runs normally and its successful response
+is stored in the "idempotency" cache for IDEMPOTENCY_TTL seconds. Retries
+with the same key get the stored response back without running the view
+again. A concurrent duplicate waits on a per-key lock until the first
+request finishes. Reusing a key with a different body is rejected.
+
+The lock holds a token unique to its holder and is only released by that
+holder, so a request that outlived IDEMPOTENCY_LOCK_TIMEOUT can't release
+the lock a later request has taken since.
+"""
+import hashlib
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework import status
+from rest_framework.response import Response
+
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+_release_lock = threading.Lock()  # Makes get-and-delete atomic on in-process caches
+
+
+def _cache():
+    return caches['idempotency']
+
+
+def _request_fingerprint(request):
+    return hashlib.sha256(request.body).hexdigest()
+
+
+def idempotent(request, key, run):
+    """Return `run()`'s response, or the stored one if `key` was already used by this user"""
+    if len(key) > MAX_KEY_LENGTH:
+        return Response({'error': 'Idempotency-Key is too long'}, status=status.HTTP_400_BAD_REQUEST)
+    store = _cache()
+    digest = hashlib.sha256(f'{request.user.pk}:{request.path}:{key}'.encode()).hexdigest()
+    response_key, lock_key = f'response:{digest}', f'lock:{digest}'
+    fingerprint = _request_fingerprint(request)
+    owner = uuid.uuid4().hex
+
+    deadline = time.monotonic() + settings.IDEMPOTENCY_LOCK_WAIT
+    while True:
+        stored = store.get(response_key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+        if store.add(lock_key, owner, settings.IDEMPOTENCY_LOCK_TIMEOUT):
+            break
+        if time.monotonic() >= deadline:
+            return Response(
+                {'error': 'A request with this Idempotency-Key is still in progress'},
+                status=status.HTTP_409_CONFLICT,
+            )
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        # Re-check: the previous holder may have stored its response just before we got the lock
+        stored = store.get(response_key)
+        if stored is not None:
+            return _replay(stored, fingerprint)
+        response = run()
+        if status.is_success(response.status_code):
+            store.set(response_key, {
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+            }, settings.IDEMPOTENCY_TTL)
+        return response
+    finally:
+        _release(store, lock_key, owner)
+
+
+def _release(store, lock_key, owner):
+    """Delete `lock_key` if it still holds `owner`"""
+    if isinstance(store, RedisCache):
+        key = store.make_and_validate_key(lock_key)
+        client = store._cache.get_client(key, write=True)
+        client.eval(RELEASE_SCRIPT, 1, key, store._cache._serializer.dumps(owner))
+        return
+    with _release_lock:
+        if store.get(lock_key) == owner:
+            store.delete(lock_key)
+
+
+def _replay(stored, fingerprint):
+    if stored['fingerprint'] != fingerprint:
+        return Response(
+            {'error': 'Idempotency-Key was already used with a different request body'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(stored['data'], status=stored['status'])
+    response['Idempotent-Replayed'] = 'true'
+    return response
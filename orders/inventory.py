@@ -0,0 +1,113 @@
+"""
+Per-item stock, decremented as orders are placed.
+
+An item's stock is spread over one or more ItemStock slot rows; items with
+no rows aren't tracked and never sell out. Taking stock is a conditional
+UPDATE ... SET quantity = quantity - n WHERE quantity >= n against one
+slot, starting from a random one, so the database decides whether there's
+enough and concurrent orders for a busy item mostly lock different rows.
+Only when no single slot can cover the order are the item's slots locked
+together and drained in turn.
+
+Cancelling or deleting an order puts its lines back (restock(), via
+lifecycle.py), into one random slot per item.
+
+Selling out or restocking an item bumps the menu version, which is how
+MenuListView's sold_out flags stay current.
+"""
+import random
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .menu_cache import bump_menu_version
+from .models import ItemStock, OrderLine
+
+MAX_SLOTS = 16
+
+
+class OutOfStock(Exception):
+    def __init__(self, item_ids):
+        super().__init__(f"Not enough stock for items: {', '.join(map(str, item_ids))}")
+        self.item_ids = item_ids
+
+
+def set_stock(menu_item_id, quantity, slots=1):
+    """Replace an item's stock, split over `slots` rows; None stops tracking it"""
+    with transaction.atomic():
+        ItemStock.objects.filter(menu_item_id=menu_item_id).delete()
+        if quantity is not None:
+            share, extra = divmod(quantity, slots)
+            ItemStock.objects.bulk_create([
+                ItemStock(menu_item_id=menu_item_id, slot=slot, quantity=share + (1 if slot < extra else 0))
+                for slot in range(slots)
+            ])
+        transaction.on_commit(bump_menu_version)
+
+
+def stock_levels(menu_item_ids):
+    """{item_id: (quantity, slots)} for the tracked items among `menu_item_ids`"""
+    rows = (
+        ItemStock.objects.filter(menu_item_id__in=menu_item_ids)
+        .values('menu_item_id')
+        .annotate(total=Sum('quantity'), slots=Count('id'))
+        .values_list('menu_item_id', 'total', 'slots')
+    )
+    return {item_id: (total, slots) for item_id, total, slots in rows}
+
+
+def take(quantities):
+    """
+    Take {item_id: quantity} from stock; call inside the order's transaction.
+
+    Raises OutOfStock, naming every short item, after which the caller's
+    transaction must roll back. Items are taken in id order so two orders
+    can't lock each other's rows in opposite orders.
+    """
+    tracked = stock_levels(list(quantities))
+    short = [item_id for item_id in sorted(tracked) if not _take_one(item_id, quantities[item_id], tracked[item_id][1])]
+    if short:
+        raise OutOfStock(short)
+    if tracked and ItemStock.objects.filter(menu_item_id__in=tracked).values('menu_item_id').annotate(
+        total=Sum('quantity')
+    ).filter(total=0).exists():
+        transaction.on_commit(bump_menu_version)  # Something just sold out
+
+
+def restock(order_ids):
+    """Return the lines of cancelled or deleted orders to stock; call inside that transaction, before a delete"""
+    quantities = Counter()
+    for item_id, quantity in OrderLine.objects.filter(order_id__in=order_ids).values_list('menu_item_id', 'quantity'):
+        quantities[item_id] += quantity
+    tracked = stock_levels(list(quantities))
+    for item_id in sorted(tracked):
+        ItemStock.objects.filter(menu_item_id=item_id, slot=random.randrange(tracked[item_id][1])).update(
+            quantity=F('quantity') + quantities[item_id],
+        )
+    if any(total == 0 for total, _ in tracked.values()):
+        transaction.on_commit(bump_menu_version)  # Something is back in stock
+
+
+def _take_one(menu_item_id, quantity, slots):
+    slot_rows = ItemStock.objects.filter(menu_item_id=menu_item_id)
+    start = random.randrange(slots)
+    for offset in range(slots):
+        slot = (start + offset) % slots
+        if slot_rows.filter(slot=slot, quantity__gte=quantity).update(quantity=F('quantity') - quantity):
+            return True
+    if slots == 1:
+        return False
+    # No single slot covers it: lock every slot so the total can't move, then drain them
+    locked = list(slot_rows.select_for_update().order_by('slot').values_list('id', 'quantity'))
+    if sum(available for _, available in locked) < quantity:
+        return False
+    left = quantity
+    for row_id, available in locked:
+        part = min(available, left)
+        if part:
+            ItemStock.objects.filter(id=row_id).update(quantity=F('quantity') - part)
+            left -= part
+        if not left:
+            break
+    return True
@@ -0,0 +1,151 @@
+"""
+Kitchen prep board: outstanding units per menu item across PENDING and
+ACCEPTED orders.
+
+One counter per menu item lives in the shared cache. lifecycle.py adjusts
+them as orders are created, move in or out of the outstanding statuses,
+or are deleted. The deltas are computed inside the order's transaction
+and applied on commit, so a rollback leaves the counters alone. Reading
+the board costs one menu query and one get_many; categories are summed
+from the item counters at read time, so a recategorised item never drifts.
+Total outstanding orders and units have their own counters so admission
+control (admission.py) can read the load in one round trip.
+
+Counters are rebuilt from the database when they're missing, e.g. after
+a cache flush. reconcile() checks them against the database and fixes
+drift. The board runs it at most once per KITCHEN_RECONCILE_INTERVAL,
+and the reconcile_kitchen_board command runs it on demand.
+"""
+import logging
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+
+from .models import MenuItem, Order, OrderLine
+
+logger = logging.getLogger(__name__)
+
+OUTSTANDING_STATUSES = ('PENDING', 'ACCEPTED')
+KEY_PREFIX = 'kitchen:units:'
+ORDERS_KEY = 'kitchen:total_orders'
+UNITS_KEY = 'kitchen:total_units'
+READY_KEY = 'kitchen:ready'
+RECONCILE_KEY = 'kitchen:reconciled'
+
+
+def _key(item_id):
+    return f'{KEY_PREFIX}{item_id}'
+
+
+def _unit_deltas(orders, sign):
+    units = Counter()
+    order_ids = [order.id for order in orders]
+    if order_ids:
+        lines = OrderLine.objects.filter(order_id__in=order_ids).values_list('menu_item_id', 'quantity')
+        for item_id, quantity in lines:
+            units[item_id] += sign * quantity
+    return units
+
+
+def _apply_on_commit(units, orders):
+    deltas = {_key(item_id): n for item_id, n in units.items() if n}
+    if deltas or orders:
+        deltas[ORDERS_KEY] = orders
+        deltas[UNITS_KEY] = sum(units.values())
+        transaction.on_commit(lambda: _apply(deltas))
+
+
+def _apply(deltas):
+    if cache.get(READY_KEY) is None:
+        rebuild()  # Reads the committed state, this change included
+        return
+    for key, n in deltas.items():
+        if n:
+            cache.add(key, 0, timeout=None)
+            cache.incr(key, n)
+
+
+def orders_created(orders):
+    outstanding = [order for order in orders if order.status in OUTSTANDING_STATUSES]
+    _apply_on_commit(_unit_deltas(outstanding, 1), len(outstanding))
+
+
+def orders_status_changed(changes):
+    entering = [order for order, previous in changes
+                if order.status in OUTSTANDING_STATUSES and previous not in OUTSTANDING_STATUSES]
+    leaving = [order for order, previous in changes
+               if order.status not in OUTSTANDING_STATUSES and previous in OUTSTANDING_STATUSES]
+    units = _unit_deltas(entering, 1)
+    units.update(_unit_deltas(leaving, -1))
+    _apply_on_commit(units, len(entering) - len(leaving))
+
+
+def orders_deleted(orders):
+    outstanding = [order for order in orders if order.status in OUTSTANDING_STATUSES]
+    _apply_on_commit(_unit_deltas(outstanding, -1), -len(outstanding))
+
+
+def database_counters():
+    """Every counter's value straight from the orders and their lines, keyed by cache key"""
+    rows = (
+        OrderLine.objects.filter(order__status__in=OUTSTANDING_STATUSES)
+        .values('menu_item_id')
+        .annotate(units=Sum('quantity'))
+        .values_list('menu_item_id', 'units')
+    )
+    counters = {_key(item_id): 0 for item_id in MenuItem.objects.values_list('id', flat=True)}
+    counters.update((_key(item_id), units) for item_id, units in rows)
+    counters[UNITS_KEY] = sum(counters.values())
+    counters[ORDERS_KEY] = Order.objects.filter(status__in=OUTSTANDING_STATUSES).count()
+    return counters
+
+
+def rebuild():
+    cache.set_many(database_counters(), timeout=None)
+    cache.set(READY_KEY, True, timeout=None)
+
+
+def reconcile():
+    """Compare the counters with the database, correct any drift and return it as {key: (cached, actual)}"""
+    actual = database_counters()
+    cached = cache.get_many(list(actual))
+    drift = {}
+    for key, want in actual.items():
+        have = cached.get(key, 0)
+        if have != want:
+            drift[key] = (have, want)
+    if drift:
+        logger.warning('Kitchen board drifted on %d counters: %s', len(drift), drift)
+        # As deltas, so increments landing since the read aren't overwritten
+        _apply({key: want - have for key, (have, want) in drift.items()})
+    cache.set(READY_KEY, True, timeout=None)
+    return drift
+
+
+def load():
+    """(outstanding orders, outstanding units) from two counters"""
+    if cache.get(READY_KEY) is None:
+        rebuild()
+    totals = cache.get_many([ORDERS_KEY, UNITS_KEY])
+    return totals.get(ORDERS_KEY, 0), totals.get(UNITS_KEY, 0)
+
+
+def board():
+    """Outstanding units per item (busiest first) and per category"""
+    if cache.get(READY_KEY) is None:
+        rebuild()
+    elif cache.add(RECONCILE_KEY, True, timeout=settings.KITCHEN_RECONCILE_INTERVAL):
+        reconcile()
+    menu = list(MenuItem.objects.order_by('id').values_list('id', 'name', 'category'))
+    cached = cache.get_many([_key(item_id) for item_id, _, _ in menu])
+    items, categories = [], Counter()
+    for item_id, name, category in menu:
+        units = cached.get(_key(item_id), 0)
+        if units:
+            items.append({'id': item_id, 'name': name, 'category': category, 'units': units})
+            categories[category] += units
+    items.sort(key=lambda item: -item['units'])
+    return {'items': items, 'categories': dict(categories)}
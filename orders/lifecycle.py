@@ -0,0 +1,42 @@
+"""
+Single entry point for order side effects.
+
+Every code path that creates orders or changes their status reports here,
+so live events, the sales rollups, the kitchen board, admission control
+and stock stay in step with the order table.
+"""
+from django.db import transaction
+
+from . import admission, analytics, inventory, kitchen
+from .events import ORDER_CREATED, ORDER_STATUS_CHANGED, publish_order_events
+
+
+def orders_created(orders):
+    analytics.record_orders_created(orders)
+    kitchen.orders_created(orders)
+    transaction.on_commit(admission.update_delivery_status)
+    publish_order_events(ORDER_CREATED, orders)
+
+
+def orders_status_changed(changes):
+    """`changes` is a list of (order, previous_status) pairs"""
+    changes = [(order, previous) for order, previous in changes if order.status != previous]
+    if not changes:
+        return
+    analytics.record_status_changes(changes)
+    kitchen.orders_status_changed(changes)
+    cancelled = [order.id for order, _ in changes if order.status == analytics.CANCELLED]
+    if cancelled:
+        inventory.restock(cancelled)
+    transaction.on_commit(admission.update_delivery_status)
+    publish_order_events(ORDER_STATUS_CHANGED, [order for order, _ in changes])
+
+
+def orders_deleted(orders):
+    """Call inside the deleting transaction, before the rows go"""
+    analytics.record_orders_deleted(orders)
+    kitchen.orders_deleted(orders)
+    live = [order.id for order in orders if order.status != analytics.CANCELLED]  # Cancelled ones were restocked already
+    if live:
+        inventory.restock(live)
+    transaction.on_commit(admission.update_delivery_status)
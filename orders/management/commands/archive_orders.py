@@ -0,0 +1,112 @@
+"""
+Move finished orders past the retention age out of Order.
+
+DELIVERED and PAID orders (and CANCELLED ones, unless --delete-cancelled)
+older than --days are copied into OrderArchive together with their lines
+and then deleted from Order. With --delete-cancelled, cancelled orders are
+deleted without a copy, and they leave the sales rollups the way any
+other deleted order does (lifecycle.orders_deleted), which is also what
+rebuild_sales_rollups would find.
+
+Each batch is its own transaction: select up to --batch-size ids, skipping
+rows another transaction has locked, archive them, delete them and commit.
+The command sleeps --sleep seconds between batches to keep the write load
+on the live database low. It can be stopped at any point; a rerun
+picks up whatever is still in Order. Archived orders stay in the sales
+rollups.
+
+Schedule it daily (cron, Heroku Scheduler):
+
+    python manage.py archive_orders --days 180 --batch-size 500 --sleep 0.5 --max-seconds 600
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from orders import lifecycle
+from orders.models import Order, OrderArchive, OrderLine
+
+FINISHED_STATUSES = ['DELIVERED', 'PAID', 'CANCELLED']
+
+
+class Command(BaseCommand):
+    help = 'Archive (or delete, for cancelled) finished orders older than the retention age, in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ORDER_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--sleep', type=float, default=0.5, help='Pause between batches, in seconds')
+        parser.add_argument('--max-seconds', type=float, default=None, help='Stop starting new batches after this long')
+        parser.add_argument('--delete-cancelled', action='store_true', help='Delete cancelled orders instead of archiving them')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what would be moved')
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--days and --batch-size must be positive')
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        candidates = Order.objects.filter(status__in=FINISHED_STATUSES, created_at__lt=cutoff)
+        if options['dry_run']:
+            self.stdout.write(f'{candidates.count()} orders older than {cutoff:%Y-%m-%d} would be moved')
+            return
+
+        started = time.monotonic()
+        archived = deleted = 0
+        while True:
+            with transaction.atomic():
+                batch = self.claim(candidates, options['batch_size'])
+                if not batch:
+                    break
+                drop = options['delete_cancelled']
+                keep = [order for order in batch if not (drop and order.status == 'CANCELLED')]
+                OrderArchive.objects.bulk_create([self.archive_row(order) for order in keep], ignore_conflicts=True)
+                if len(keep) < len(batch):
+                    lifecycle.orders_deleted([order for order in batch if order not in keep])
+                Order.objects.filter(id__in=[order.id for order in batch]).delete()
+            archived += len(keep)
+            deleted += len(batch) - len(keep)
+            self.stdout.write(f'{archived} archived, {deleted} deleted (through id {batch[-1].id})')
+            if options['max_seconds'] is not None and time.monotonic() - started >= options['max_seconds']:
+                self.stdout.write('Time budget used up; rerun to continue')
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Done: {archived} orders archived, {deleted} cancelled orders deleted'))
+
+    @staticmethod
+    def claim(candidates, size):
+        """Lock the next batch, skipping rows that are busy elsewhere so we never queue behind them"""
+        queryset = candidates.order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        ids = list(queryset.values_list('id', flat=True)[:size])
+        return list(
+            Order.objects.filter(id__in=ids).order_by('id').prefetch_related(
+                Prefetch('lines', queryset=OrderLine.objects.order_by('id'))
+            )
+        )
+
+    @staticmethod
+    def archive_row(order):
+        return OrderArchive(
+            order_id=order.id,
+            user_id=order.user_id,
+            status=order.status,
+            total_price=order.total_price,
+            created_at=order.created_at,
+            data={
+                'phone': order.phone,
+                'location': order.location,
+                'latitude': str(order.latitude) if order.latitude is not None else None,
+                'longitude': str(order.longitude) if order.longitude is not None else None,
+                'delivery_charge': str(order.delivery_charge),
+                'items_data': order.items_data,
+                'lines': [
+                    {'menu_item': line.menu_item_id, 'quantity': line.quantity, 'unit_price': str(line.unit_price)}
+                    for line in order.lines.all()
+                ],
+            },
+        )
@@ -0,0 +1,86 @@
+"""
+Measure how a burst of logins affects the latency of other endpoints.
+
+Drives the ASGI app in-process: probes GET /api/menu/ on its own, then again
+while --logins concurrent logins hit /api/auth/login/, and reports p50/p99
+for both runs plus how the logins ended (200 / 503 from the hashing queue):
+
+    python manage.py bench_login_storm --logins 200 --probes 200
+"""
+import asyncio
+import statistics
+import time
+import uuid
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient
+
+from orders.models import CustomUser
+
+PROBE_URL = '/api/menu/'
+LOGIN_URL = '/api/auth/login/'
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = 'Report p50/p99 of GET /api/menu/ with and without a concurrent login storm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200)
+        parser.add_argument('--probes', type=int, default=200)
+
+    def handle(self, *args, **options):
+        email = f'bench-{uuid.uuid4().hex[:8]}@example.invalid'
+        password = uuid.uuid4().hex
+        user = CustomUser.objects.create_user(email, 'Bench', password)
+        try:
+            asyncio.run(self.run(email, password, options))
+        finally:
+            user.delete()
+
+    async def run(self, email, password, options):
+        client = AsyncClient()
+        await client.get(PROBE_URL)  # Warm the menu cache
+
+        async def probe():
+            latencies = []
+            for _ in range(options['probes']):
+                started = time.perf_counter()
+                await client.get(PROBE_URL)
+                latencies.append((time.perf_counter() - started) * 1000)
+            return latencies
+
+        async def login():
+            response = await client.post(
+                LOGIN_URL, {'email': email, 'password': password}, content_type='application/json'
+            )
+            return response.status_code
+
+        baseline = await probe()
+        started = time.perf_counter()
+        storm = [asyncio.create_task(login()) for _ in range(options['logins'])]
+        during = await probe()
+        outcomes = Counter(await asyncio.gather(*storm))
+        elapsed = time.perf_counter() - started
+
+        await sync_to_async(self.report)(baseline, during, outcomes, elapsed)
+
+    def report(self, baseline, during, outcomes, elapsed):
+        self.stdout.write(
+            f'AUTH_HASH_CONCURRENCY={settings.AUTH_HASH_CONCURRENCY} '
+            f'AUTH_HASH_QUEUE_TIMEOUT={settings.AUTH_HASH_QUEUE_TIMEOUT}s'
+        )
+        for label, latencies in (('idle', baseline), ('login storm', during)):
+            self.stdout.write(
+                f'{PROBE_URL} {label}: p50 {statistics.median(latencies):.1f} ms, '
+                f'p99 {percentile(latencies, 99):.1f} ms'
+            )
+        summary = ', '.join(f'{code}: {count}' for code, count in sorted(outcomes.items()))
+        self.stdout.write(f'logins finished in {elapsed:.1f}s ({summary})')
@@ -0,0 +1,62 @@
+"""
+Benchmark RequestMetricsMiddleware's own cost per request.
+
+Calls a trivial view --requests times with and without the middleware in
+front of it, alternating the two over --repeat rounds so machine noise hits
+both alike, and reports the best per-request time of each and the
+difference:
+
+    python manage.py bench_metrics_middleware --requests 20000 --budget-us 50
+
+Runs in this process only and resets the in-process metrics afterwards.
+"""
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from orders import metrics
+from orders.middleware import RequestMetricsMiddleware
+
+
+class Command(BaseCommand):
+    help = "Time the request metrics middleware's overhead on a trivial view"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='Requests per round')
+        parser.add_argument('--repeat', type=int, default=5, help='Rounds; the best of each side is compared')
+        parser.add_argument('--budget-us', type=float, default=100.0, help='Fail if the overhead exceeds this')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['repeat'] < 1:
+            raise CommandError('--requests and --repeat must be positive')
+        request = RequestFactory().get('/api/menu/')
+
+        def view(request):
+            return HttpResponse('ok')
+
+        wrapped = RequestMetricsMiddleware(view)
+        try:
+            self.per_request(wrapped, request, options['requests'])  # Warm up
+            bare, measured = [], []
+            for _ in range(options['repeat']):
+                bare.append(self.per_request(view, request, options['requests']))
+                measured.append(self.per_request(wrapped, request, options['requests']))
+        finally:
+            metrics.registry.reset()
+
+        overhead = (min(measured) - min(bare)) * 1e6
+        self.stdout.write(
+            f"{options['requests']} requests x {options['repeat']}: bare {min(bare) * 1e6:.2f} us, "
+            f"with metrics {min(measured) * 1e6:.2f} us, overhead {overhead:.2f} us per request"
+        )
+        if overhead > options['budget_us']:
+            raise CommandError(f"Overhead {overhead:.2f} us is over the {options['budget_us']:.0f} us budget")
+
+    @staticmethod
+    def per_request(handler, request, count):
+        started = time.perf_counter()
+        for _ in range(count):
+            handler(request)
+        return (time.perf_counter() - started) / count
@@ -0,0 +1,123 @@
+"""
+Benchmark the Order index plan on a seeded table.
+
+Seeds --rows orders inside a transaction, prints EXPLAIN output and timings
+for the hot order queries with the indexes in place and again with them
+dropped, then rolls everything back:
+
+    python manage.py bench_order_indexes --rows 1000000
+"""
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from orders.models import CustomUser, Order
+
+STATUS_WEIGHTS = {
+    'PENDING': 2,
+    'ACCEPTED': 2,
+    'DELIVERYOUT': 1,
+    'DELIVERED': 40,
+    'PAID': 45,
+    'CANCELLED': 10,
+}
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Seed orders in a rolled-back transaction and report query plans and timings for the order indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000)
+        parser.add_argument('--users', type=int, default=5_000)
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per query; the median is reported')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['users'] < 1:
+            raise CommandError('--rows and --users must be positive')
+        random.seed(options['seed'])
+        try:
+            with transaction.atomic():
+                self.seed(options)
+                self.analyze()
+                self.run_queries('with indexes', options['repeat'])
+                self.drop_indexes()
+                self.analyze()
+                self.run_queries('without indexes', options['repeat'])
+                raise Rollback
+        except Rollback:
+            self.stdout.write('Seeded data and index changes rolled back.')
+
+    def seed(self, options):
+        started = time.perf_counter()
+        users = CustomUser.objects.bulk_create([
+            CustomUser(email=f'bench-{i}@example.invalid', name=f'Bench {i}', password='!')
+            for i in range(options['users'])
+        ])
+        self.user = users[0]
+        statuses = list(STATUS_WEIGHTS)
+        weights = list(STATUS_WEIGHTS.values())
+        now = timezone.now()
+        # created_at is auto_now_add; switch that off while seeding so it can be spread over a year
+        created_at = Order._meta.get_field('created_at')
+        created_at.auto_now_add = False
+        try:
+            remaining = options['rows']
+            while remaining:
+                size = min(options['batch_size'], remaining)
+                Order.objects.bulk_create([
+                    Order(
+                        user=random.choice(users),
+                        status=random.choices(statuses, weights)[0],
+                        total_price=Decimal('250.00'),
+                        created_at=now - timedelta(seconds=random.randrange(365 * 24 * 3600)),
+                    )
+                    for _ in range(size)
+                ])
+                remaining -= size
+        finally:
+            created_at.auto_now_add = True
+        self.stdout.write(f"Seeded {options['rows']} orders in {time.perf_counter() - started:.1f}s")
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def drop_indexes(self):
+        # Plain DROP INDEX rather than the schema editor, which SQLite refuses inside a transaction
+        with connection.cursor() as cursor:
+            for index in Order._meta.indexes:
+                cursor.execute(f'DROP INDEX {connection.ops.quote_name(index.name)}')
+
+    def queries(self):
+        since = timezone.now() - timedelta(days=1)
+        return {
+            'user order history': Order.objects.filter(user=self.user).order_by('-created_at', '-id')[:50],
+            'admin list (exclude CANCELLED)': (
+                Order.objects.exclude(status='CANCELLED').order_by('-created_at', '-id')[:50]
+            ),
+            'admin status + date filter': Order.objects.filter(status='DELIVERED', created_at__gte=since),
+            'active orders': Order.objects.filter(status__in=Order.ACTIVE_STATUSES).order_by('created_at')[:200],
+        }
+
+    def run_queries(self, label, repeat):
+        self.stdout.write(self.style.MIGRATE_HEADING(f'== {label} =='))
+        for name, queryset in self.queries().items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - started) * 1000)
+            self.stdout.write(self.style.SUCCESS(f'{name}: median {statistics.median(timings):.2f} ms'))
+            self.stdout.write(queryset.explain())
@@ -0,0 +1,75 @@
+"""
+Benchmark the rider batching and route planner on synthetic stops.
+
+Scatters --orders stops within --radius km of the restaurant, plans them
+--repeat times and reports timings and how much 2-opt saved over plain
+nearest neighbour:
+
+    python manage.py bench_route_planner --orders 500 --capacity 5
+"""
+import math
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from orders import route_planner
+
+
+class Command(BaseCommand):
+    help = 'Time the dispatch route planner on synthetic active orders'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=500)
+        parser.add_argument('--capacity', type=int, default=5)
+        parser.add_argument('--radius', type=float, default=8.0, help='km around the restaurant')
+        parser.add_argument('--repeat', type=int, default=10, help='Runs; the median and max are reported')
+        parser.add_argument('--budget-ms', type=float, default=1000.0, help='Fail if the median exceeds this')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['orders'] < 1 or options['capacity'] < 1:
+            raise CommandError('--orders and --capacity must be positive')
+        rng = random.Random(options['seed'])
+        origin = (settings.RESTAURANT_LATITUDE, settings.RESTAURANT_LONGITUDE)
+        stops = [self.random_stop(rng, origin, options['radius'], i) for i in range(options['orders'])]
+
+        timings = []
+        for _ in range(options['repeat']):
+            started = time.perf_counter()
+            plans = route_planner.plan_routes(origin, stops, options['capacity'])
+            timings.append((time.perf_counter() - started) * 1000)
+
+        median = statistics.median(timings)
+        self.stdout.write(
+            f"{options['orders']} orders, capacity {options['capacity']}: {len(plans)} batches, "
+            f"median {median:.1f} ms, max {max(timings):.1f} ms"
+        )
+        self.stdout.write(f'2-opt saved {self.two_opt_saving(origin, stops, options["capacity"]):.1f}% over nearest neighbour')
+        if median > options['budget_ms']:
+            raise CommandError(f"Median {median:.1f} ms is over the {options['budget_ms']:.0f} ms budget")
+
+    @staticmethod
+    def random_stop(rng, origin, radius, order_id):
+        distance = radius * math.sqrt(rng.random())
+        bearing = rng.uniform(0, 2 * math.pi)
+        return {
+            'id': order_id,
+            'latitude': origin[0] + distance * math.sin(bearing) / route_planner.KM_PER_DEGREE_LAT,
+            'longitude': origin[1] + distance * math.cos(bearing) / (
+                route_planner.KM_PER_DEGREE_LNG * math.cos(math.radians(origin[0]))
+            ),
+        }
+
+    @staticmethod
+    def two_opt_saving(origin, stops, capacity):
+        coords = route_planner.project(origin, [(stop['latitude'], stop['longitude']) for stop in stops])
+        greedy = improved = 0.0
+        for batch in route_planner.cluster_batches(coords, capacity):
+            matrix = route_planner.distance_matrix([(0.0, 0.0)] + [coords[i] for i in batch])
+            route = route_planner.nearest_neighbour(matrix)
+            greedy += route_planner.route_length(route, matrix)
+            improved += route_planner.route_length(route_planner.two_opt(route, matrix), matrix)
+        return 100 * (greedy - improved) / greedy if greedy else 0.0
@@ -0,0 +1,21 @@
+"""
+Check the kitchen board counters against the order lines and fix any drift.
+
+The board already reconciles itself every KITCHEN_RECONCILE_INTERVAL
+seconds while it's being read; schedule this to cover quiet periods:
+
+    python manage.py reconcile_kitchen_board
+"""
+from django.core.management.base import BaseCommand
+
+from orders import kitchen
+
+
+class Command(BaseCommand):
+    help = 'Reconcile the cached kitchen board counters with the database'
+
+    def handle(self, *args, **options):
+        drift = kitchen.reconcile()
+        for key, (cached, actual) in sorted(drift.items()):
+            self.stdout.write(f'{key}: cached {cached}, actual {actual}')
+        self.stdout.write(self.style.SUCCESS(f'Kitchen board reconciled, {len(drift)} counters corrected'))
@@ -0,0 +1,86 @@
+"""
+Summarise the slow-query log: the query shapes costing the most total time.
+
+Reads SLOW_QUERY_LOG_FILE and its rotated backups (or the files given),
+groups entries by fingerprint and prints the top --limit by total time,
+with their count, mean and max durations, the call sites issuing them and
+the latest EXPLAIN plan:
+
+    python manage.py summarize_slow_queries --limit 10
+    python manage.py summarize_slow_queries --since 2026-10-01 --slow-only
+
+Sampled (below-threshold) entries are included unless --slow-only, since
+a cheap query run thousands of times can cost more than one slow one.
+"""
+import glob
+import json
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Rank logged slow queries by total time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='*', help='Log files to read (default: SLOW_QUERY_LOG_FILE and its backups)')
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--since', help='Only entries logged at or after this ISO date/time')
+        parser.add_argument('--slow-only', action='store_true', help='Ignore sampled entries below the threshold')
+        parser.add_argument('--no-plans', action='store_true', help="Don't print EXPLAIN plans")
+
+    def handle(self, *args, **options):
+        paths = options['files'] or sorted(glob.glob(glob.escape(settings.SLOW_QUERY_LOG_FILE) + '*'))
+        if not paths:
+            raise CommandError(f'No slow-query log at {settings.SLOW_QUERY_LOG_FILE}; is SLOW_QUERY_LOG on?')
+        groups, skipped = {}, 0
+        for path in paths:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line)
+                        except ValueError:
+                            skipped += 1  # A line cut short by rotation or a crash
+                            continue
+                        if options['since'] and entry['at'] < options['since']:
+                            continue
+                        if options['slow_only'] and not entry.get('slow', True):
+                            continue
+                        self.add(groups, entry)
+            except OSError as e:
+                raise CommandError(f'Cannot read {path}: {e}')
+
+        ranked = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)[:options['limit']]
+        total = sum(group['total_ms'] for group in groups.values())
+        self.stdout.write(f'{sum(g["count"] for g in groups.values())} entries, {len(groups)} distinct queries, {total:.0f} ms in total')
+        for rank, group in enumerate(ranked, 1):
+            self.stdout.write('')
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'#{rank} {group["fingerprint"]}: {group["total_ms"]:.0f} ms total, {group["count"]} calls, '
+                f'mean {group["total_ms"] / group["count"]:.1f} ms, max {group["max_ms"]:.1f} ms'
+            ))
+            self.stdout.write(f'  {group["sql"]}')
+            for site, count in group['call_sites'].most_common(3):
+                self.stdout.write(f'  from {site} ({count}x)')
+            if group['plan'] and not options['no_plans']:
+                for plan_line in group['plan'].splitlines():
+                    self.stdout.write(f'    {plan_line}')
+        if skipped:
+            self.stdout.write(self.style.WARNING(f'{skipped} unreadable lines skipped'))
+
+    @staticmethod
+    def add(groups, entry):
+        group = groups.get(entry['fingerprint'])
+        if group is None:
+            group = groups[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'], 'sql': entry['sql'], 'count': 0,
+                'total_ms': 0.0, 'max_ms': 0.0, 'call_sites': Counter(), 'plan': None,
+            }
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        group['call_sites'][entry['call_site']] += 1
+        if entry.get('plan'):
+            group['plan'] = entry['plan']
@@ -0,0 +1,75 @@
+"""
+Versioned caches for the public menu payload and the menu price table.
+
+Both are built once per version and served from the cache until a menu
+change bumps the version counter (see signals.py).
+"""
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import MenuItem
+
+MENU_VERSION_KEY = 'menu:version'
+MENU_PAYLOAD_KEY = 'menu:payload:{version}'
+MENU_PRICES_KEY = 'menu:prices:{version}'
+
+
+def get_menu_version():
+    """Return the current menu version, seeding it from the clock if missing"""
+    version = cache.get(MENU_VERSION_KEY)
+    if version is None:
+        # Seeding from the clock means a flushed cache never reuses an old version
+        cache.add(MENU_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(MENU_VERSION_KEY)
+    return version
+
+
+def bump_menu_version():
+    """Invalidate the cached menu for every worker sharing the cache"""
+    try:
+        cache.incr(MENU_VERSION_KEY)
+    except ValueError:
+        get_menu_version()
+
+
+def get_menu_payload(build):
+    """
+    Return the cached menu payload for the current version.
+
+    `build` is only called on a miss and must return the serialized menu.
+    The payload carries the data plus the ETag / Last-Modified validators.
+    """
+    key = MENU_PAYLOAD_KEY.format(version=get_menu_version())
+    payload = cache.get(key)
+    if payload is None:
+        data = [dict(item) for item in build()]
+        body = json.dumps(data, cls=DjangoJSONEncoder, sort_keys=True).encode()
+        payload = {
+            'data': data,
+            'etag': '"%s"' % hashlib.md5(body).hexdigest(),
+            'last_modified': int(time.time()),
+        }
+        cache.set(key, payload, settings.MENU_CACHE_TIMEOUT)
+    return payload
+
+
+def get_price_table():
+    """
+    Return {menu_item_id: (price, name)} for the current menu version.
+
+    Shares the menu version, so any menu change also refreshes prices.
+    """
+    key = MENU_PRICES_KEY.format(version=get_menu_version())
+    table = cache.get(key)
+    if table is None:
+        table = {
+            item_id: (price, name)
+            for item_id, price, name in MenuItem.objects.values_list('id', 'price', 'name')
+        }
+        cache.set(key, table, settings.MENU_CACHE_TIMEOUT)
+    return table
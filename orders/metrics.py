@@ -0,0 +1,147 @@
+"""
+In-process request metrics, rendered in the Prometheus text format.
+
+RequestMetricsMiddleware records, per route and method: latency, status
+codes, DB query count and time, and response size. Everything is
+aggregated in this worker's memory under one lock: a request costs a few
+bisects and dict updates, no I/O. Methods outside the standard HTTP set
+are recorded as `other`, so clients can't grow the label set at will.
+The bench_metrics_middleware command measures the per-request overhead. Each worker reports its own numbers
+with a `pid` label, so sum over it when several workers share a port.
+
+DB queries are counted by an execute wrapper installed on every new
+connection (see install_query_hook). It adds to the current request's
+totals through a context variable, so queries made from sync_to_async
+threads in async views are counted too.
+"""
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'})
+
+_request_db = ContextVar('request_db', default=None)
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = {}  # (route, method, status) -> count
+        self.latency = {}
+        self.db_queries = {}
+        self.db_seconds = {}
+        self.response_size = {}
+
+    def record(self, route, method, status, seconds, queries, db_seconds, size):
+        key = (route, method if method in METHODS else 'other')
+        with self.lock:
+            self.requests[key + (str(status),)] = self.requests.get(key + (str(status),), 0) + 1
+            self._histogram(self.latency, key, LATENCY_BUCKETS).observe(seconds)
+            self._histogram(self.db_queries, key, QUERY_BUCKETS).observe(queries)
+            self._histogram(self.db_seconds, key, LATENCY_BUCKETS).observe(db_seconds)
+            if size is not None:
+                self._histogram(self.response_size, key, SIZE_BUCKETS).observe(size)
+
+    @staticmethod
+    def _histogram(table, key, buckets):
+        histogram = table.get(key)
+        if histogram is None:
+            histogram = table[key] = Histogram(buckets)
+        return histogram
+
+    def render(self):
+        pid = str(os.getpid())
+        lines = []
+        with self.lock:
+            lines += [
+                '# HELP http_requests_total Requests handled, by route, method and status.',
+                '# TYPE http_requests_total counter',
+            ]
+            for (route, method, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{_labels(pid, route, method, status=status)} {count}')
+            for name, help_text, table in (
+                ('http_request_duration_seconds', 'Time from the first middleware to the response.', self.latency),
+                ('http_request_db_queries', 'Database queries per request.', self.db_queries),
+                ('http_request_db_duration_seconds', 'Time spent in database queries per request.', self.db_seconds),
+                ('http_response_size_bytes', 'Response body size, non-streaming responses only.', self.response_size),
+            ):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+                for (route, method), histogram in sorted(table.items()):
+                    lines += _histogram_lines(name, _labels(pid, route, method), histogram)
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pid, route, method, **extra):
+    pairs = [('pid', pid), ('route', route), ('method', method)] + list(extra.items())
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _histogram_lines(name, labels, histogram):
+    lines, cumulative = [], 0
+    inner = labels[1:-1]
+    for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+        cumulative += count
+        le = '+Inf' if bound == float('inf') else repr(bound)
+        lines.append(f'{name}_bucket{{{inner},le="{le}"}} {cumulative}')
+    lines.append(f'{name}_sum{labels} {histogram.total}')
+    lines.append(f'{name}_count{labels} {histogram.count}')
+    return lines
+
+
+registry = Registry()
+
+
+def start_request():
+    """Begin counting DB work for the current request; returns the token to pass to finish_request"""
+    return _request_db.set([0, 0.0])
+
+
+def finish_request(token):
+    totals = _request_db.get()
+    _request_db.reset(token)
+    return totals
+
+
+def _query_hook(execute, sql, params, many, context):
+    totals = _request_db.get()
+    if totals is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        totals[0] += 1
+        totals[1] += time.perf_counter() - started
+
+
+def install_query_hook(sender, connection, **kwargs):
+    """connection_created receiver: count this connection's queries for the request using it"""
+    if _query_hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_query_hook)
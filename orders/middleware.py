@@ -0,0 +1,132 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics, profiling
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware that can also run in async mode.
+
+    The stock middleware is sync-only, so under ASGI Django wraps everything
+    below it in async_to_sync and each async view holds the shared sync thread
+    for its whole lifetime. Static lookups are in-memory, so serving them
+    inline in async mode is fine.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records latency, status, DB queries/time and response size per route into
+    orders.metrics, served at /api/admin/metrics/. Put it first so it times
+    the rest of the stack.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token, started = metrics.start_request(), time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, started, token)
+        return response
+
+    async def __acall__(self, request):
+        token, started = metrics.start_request(), time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, started, token)
+        return response
+
+    @staticmethod
+    def record(request, response, started, token):
+        elapsed = time.perf_counter() - started
+        queries, db_seconds = metrics.finish_request(token)
+        match = request.resolver_match
+        route = match.route if match is not None else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        metrics.registry.record(route, request.method, response.status_code, elapsed, queries, db_seconds, size)
+
+
+class ProfilingMiddleware:
+    """
+    Runs a request under cProfile when an admin asks for it; see
+    orders/profiling.py. Every other request costs two dict lookups. Put
+    it last so the profile is of the view rather than the middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILE_REQUESTS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not profiling.requested(request) or not profiling.is_admin(request):
+            return self.get_response(request)
+        if not profiling.claim():
+            return self.refused(self.get_response(request))
+        run = profiling.Run(request)
+        run.enable()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            run.abandon()
+            raise
+        run.disable()
+        return run.finish(response)
+
+    async def __acall__(self, request):
+        if not profiling.requested(request) or not await sync_to_async(profiling.is_admin)(request):
+            return await self.get_response(request)
+        if not await sync_to_async(profiling.claim)():
+            return self.refused(await self.get_response(request))
+        run = profiling.Run(request, mode='async')
+        await sync_to_async(run.enable)()  # On the thread sync views run on
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            await sync_to_async(run.abandon)()
+            raise
+        await sync_to_async(run.disable)()
+        return await sync_to_async(run.finish)(response)
+
+    @staticmethod
+    def refused(response):
+        response[profiling.RESPONSE_HEADER] = 'rate-limited'
+        return response
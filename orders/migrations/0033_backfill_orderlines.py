@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+from django.db import migrations
+
+BATCH_SIZE = 500
+MAX_PRICE = Decimal('1e8')  # OrderLine.unit_price is max_digits=10, decimal_places=2
+
+
+def backfill_order_lines(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    MenuItem = apps.get_model('orders', 'MenuItem')
+    OrderLine = apps.get_model('orders', 'OrderLine')
+
+    prices = dict(MenuItem.objects.values_list('id', 'price'))
+    orders = Order.objects.filter(lines__isnull=True).prefetch_related('items')
+
+    batch = []
+    for order in orders.iterator(chunk_size=BATCH_SIZE):
+        if order.items_data:
+            entries = [entry for entry in order.items_data if isinstance(entry, dict)]
+        else:
+            # Orders placed before items_data existed: one of each item at menu price
+            entries = [{'id': item.id} for item in order.items.all()]
+        for entry in entries:
+            try:
+                item_id = int(entry['id'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if item_id not in prices:
+                continue
+            # Legacy rows hold whatever clients sent: fall back to 1 and the menu price rather than abort the deploy
+            try:
+                quantity = max(int(entry.get('quantity') or 1), 1)
+            except (TypeError, ValueError):
+                quantity = 1
+            try:
+                unit_price = Decimal(str(entry['price'])).quantize(Decimal('0.01'))
+            except (KeyError, ArithmeticError, ValueError):
+                unit_price = prices[item_id]
+            if not 0 <= unit_price < MAX_PRICE:
+                unit_price = prices[item_id]
+            batch.append(OrderLine(
+                order_id=order.id,
+                menu_item_id=item_id,
+                quantity=quantity,
+                unit_price=unit_price,
+            ))
+        if len(batch) >= BATCH_SIZE:
+            OrderLine.objects.bulk_create(batch)
+            batch = []
+    OrderLine.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0032_orderline'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_order_lines, migrations.RunPython.noop),
+    ]
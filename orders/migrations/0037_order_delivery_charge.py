@@ -0,0 +1,19 @@
+# Generated by Django 4.2.25 on 2026-10-18 15:13
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0036_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='delivery_charge',
+            field=models.DecimalField(decimal_places=2, default=Decimal('50.00'), max_digits=8),
+        ),
+    ]
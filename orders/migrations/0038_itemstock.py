@@ -0,0 +1,27 @@
+# Generated by Django 4.2.25 on 2026-10-18 15:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0037_order_delivery_charge'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField()),
+                ('quantity', models.PositiveIntegerField(default=0)),
+                ('menu_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_slots', to='orders.menuitem')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='itemstock',
+            constraint=models.UniqueConstraint(fields=('menu_item', 'slot'), name='itemstock_item_slot_uniq'),
+        ),
+    ]
@@ -84,6 +84,9 @@ class MenuItem(models.Model):
         return None
 
 
+# Orders the kitchen / riders still have to act on. Module level so Order.Meta's
+# partial index uses the same list as status__in=Order.ACTIVE_STATUSES filters.
+ACTIVE_STATUSES = ['PENDING', 'ACCEPTED', 'DELIVERYOUT']
 
 
 class Order(models.Model):
@@ -95,6 +98,17 @@ class Order(models.Model):
         ('DELIVERED', 'Delivery_Success'),
         ('PAID', 'Paid'),
     ]
+    ACTIVE_STATUSES = ACTIVE_STATUSES
+    # Allowed status changes, enforced by order_status.change_status()
+    TRANSITIONS = {
+        'PENDING': ['ACCEPTED', 'CANCELLED'],
+        'ACCEPTED': ['DELIVERYOUT', 'CANCELLED'],
+        'DELIVERYOUT': ['DELIVERED', 'PAID', 'CANCELLED'],
+        'DELIVERED': ['PAID'],
+        'PAID': [],
+        'CANCELLED': [],
+    }
+
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     items = models.ManyToManyField(MenuItem)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
@@ -105,11 +119,75 @@ class Order(models.Model):
     latitude = models.DecimalField(max_digits=12, decimal_places=9, blank=True, null=True)  # NEW
     longitude = models.DecimalField(max_digits=12, decimal_places=9, blank=True, null=True)  # NEW
     items_data = models.JSONField(default=list)  # Store quantities and prices
+    delivery_charge = models.DecimalField(max_digits=8, decimal_places=2, default=Decimal('50.00'))
+    version = models.PositiveIntegerField(default=0)  # Bumped on every status change
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),  # Order history
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),  # Admin filters
+            models.Index(fields=['-created_at', '-id'], name='order_created_id_idx'),  # Cursor pagination
+            models.Index(
+                fields=['created_at'],
+                name='order_active_created_idx',
+                condition=models.Q(status__in=ACTIVE_STATUSES),
+            ),  # Live orders only, stays small as history grows
+        ]
 
     def __str__(self):
         return f"Order {self.id} by {self.user.email}"
-    
+
+    def rebuild_lines(self):
+        """Replace this order's OrderLine rows from items_data (or the items M2M when it is empty)"""
+        if self.items_data:
+            wanted = []
+            for entry in self.items_data:
+                try:
+                    wanted.append((int(entry['id']), entry))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        else:
+            wanted = [(item_id, {}) for item_id in self.items.values_list('id', flat=True)]
+        prices = dict(
+            MenuItem.objects.filter(id__in=[item_id for item_id, _ in wanted]).values_list('id', 'price')
+        )
+        lines = []
+        for item_id, entry in wanted:
+            if item_id not in prices:
+                continue  # No longer on the menu
+            # Stored entries aren't validated; bad values fall back as in migration 0033
+            try:
+                quantity = max(int(entry.get('quantity') or 1), 1)
+            except (TypeError, ValueError):
+                quantity = 1
+            try:
+                unit_price = Decimal(str(entry['price'])).quantize(Decimal('0.01'))
+            except (KeyError, ArithmeticError, ValueError):
+                unit_price = prices[item_id]
+            if not 0 <= unit_price < OrderLine.MAX_PRICE:
+                unit_price = prices[item_id]
+            lines.append(OrderLine(order=self, menu_item_id=item_id, quantity=quantity, unit_price=unit_price))
+        self.lines.all().delete()
+        OrderLine.objects.bulk_create(lines)
+
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='order_lines')
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    MAX_PRICE = Decimal('1e8')  # Exclusive bound that fits unit_price
+
+    class Meta:
+        indexes = [
+            # Covers "units sold per item" aggregates without touching the order table
+            models.Index(fields=['menu_item', 'order'], name='orderline_item_order_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.menu_item_id} x {self.quantity} (order {self.order_id})"
+
 
 
 
@@ -141,4 +219,66 @@ class DeliveryStatus(models.Model):
     @classmethod
     def get_status(cls):
         status, created = cls.objects.get_or_create(id=1)
-        return status
\ No newline at end of file
+        return status
+
+# Sales rollups, maintained incrementally by analytics.py
+class HourlySales(models.Model):
+    """Order count and revenue per hour per status"""
+    hour = models.DateTimeField()  # Start of the hour, in settings.TIME_ZONE
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    orders = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hour', 'status'], name='hourlysales_hour_status_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.hour:%Y-%m-%d %H}:00 {self.status}: {self.orders} orders"
+
+
+class DailyItemSales(models.Model):
+    """Units and revenue per menu item per day, excluding cancelled orders"""
+    day = models.DateField()
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='daily_sales')
+    units = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'menu_item'], name='dailyitemsales_day_item_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.menu_item_id}: {self.units} units"
+
+
+# Per-item stock, maintained by inventory.py; items without rows aren't tracked
+class ItemStock(models.Model):
+    """One slot of a menu item's stock; busy items are split over several slots"""
+    menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE, related_name='stock_slots')
+    slot = models.PositiveSmallIntegerField()
+    quantity = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['menu_item', 'slot'], name='itemstock_item_slot_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.menu_item_id} slot {self.slot}: {self.quantity}"
+
+
+class OrderArchive(models.Model):
+    """A finished order moved out of Order by the archive_orders command"""
+    order_id = models.PositiveIntegerField(unique=True)  # The id it had in Order
+    user_id = models.PositiveIntegerField(db_index=True)
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField(db_index=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.JSONField(default=dict)  # Everything else: contact details, items_data, lines
+
+    def __str__(self):
+        return f"Archived order {self.order_id}"
@@ -0,0 +1,99 @@
+"""
+Order status changes as a checked state machine.
+
+Order.TRANSITIONS lists where each status may go. A change is one
+conditional UPDATE ... SET status, version = version + 1 WHERE id AND
+version AND status IN (statuses allowed to move there). If another writer
+changed the order since it was read, the update matches no row and
+StatusConflict is raised instead of overwriting their change.
+
+change_statuses() does the same for many orders in one set-based UPDATE,
+reporting a result per id and firing the change events as one batch.
+"""
+from django.db import transaction
+from django.db.models import F
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from . import lifecycle
+from .models import Order
+
+EVENT_FIELDS = ('id', 'status', 'version', 'total_price', 'created_at', 'user_id')  # What lifecycle reads
+
+
+class StatusConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_code = 'status_conflict'
+
+    def __init__(self, message):
+        super().__init__({'error': message})
+        self.message = message
+
+
+def sources(new_status):
+    """Statuses an order may move to `new_status` from"""
+    return [source for source, targets in Order.TRANSITIONS.items() if new_status in targets]
+
+
+def change_status(order_id, new_status, expected_version=None, expected_status=None):
+    """
+    Move an order to `new_status` and return it; raises Order.DoesNotExist or StatusConflict.
+
+    `expected_version` / `expected_status` are what the caller last saw; the
+    change is refused if the order has moved on since.
+    """
+    with transaction.atomic():
+        order = Order.objects.only(*EVENT_FIELDS).get(pk=order_id)
+        if expected_version is not None and order.version != expected_version:
+            raise StatusConflict(f'Order {order_id} has changed since version {expected_version}; reload it')
+        if expected_status is not None and order.status != expected_status:
+            raise StatusConflict(f'Order {order_id} is already {order.status}')
+        if new_status not in Order.TRANSITIONS[order.status]:
+            raise StatusConflict(f'Order {order_id} cannot go from {order.status} to {new_status}')
+        updated = Order.objects.filter(
+            id=order_id, version=order.version, status__in=sources(new_status),
+        ).update(status=new_status, version=F('version') + 1)
+        if not updated:
+            raise StatusConflict(f'Order {order_id} was changed by someone else; reload it')
+        previous = order.status
+        order.status, order.version = new_status, order.version + 1
+        lifecycle.orders_status_changed([(order, previous)])
+    return order
+
+
+def change_statuses(order_ids, new_status):
+    """
+    Move every order in `order_ids` that's allowed to go to `new_status`.
+
+    Returns one result per distinct id, in the order given: {'id', 'status',
+    'version'} for moved orders and {'id', 'error'} for the rest. The rows
+    are locked while they're checked, so the single UPDATE moves exactly
+    the orders that passed.
+    """
+    order_ids = list(dict.fromkeys(order_ids))
+    allowed = sources(new_status)
+    with transaction.atomic():
+        orders = Order.objects.select_for_update().filter(id__in=order_ids).only(*EVENT_FIELDS).in_bulk()
+        errors, changes = {}, []
+        for order_id in order_ids:
+            order = orders.get(order_id)
+            if order is None:
+                errors[order_id] = 'Order not found'
+            elif order.status == new_status:
+                errors[order_id] = f'Order is already {new_status}'
+            elif order.status not in allowed:
+                errors[order_id] = f'Cannot go from {order.status} to {new_status}'
+            else:
+                changes.append((order, order.status))
+        if changes:
+            Order.objects.filter(id__in=[order.id for order, _ in changes], status__in=allowed).update(
+                status=new_status, version=F('version') + 1,
+            )
+            for order, _ in changes:
+                order.status, order.version = new_status, order.version + 1
+            lifecycle.orders_status_changed(changes)
+    return [
+        {'id': order_id, 'error': errors[order_id]} if order_id in errors
+        else {'id': order_id, 'status': new_status, 'version': orders[order_id].version}
+        for order_id in order_ids
+    ]
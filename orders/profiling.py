@@ -0,0 +1,199 @@
+"""
+On-demand cProfile runs of single requests, for admins.
+
+Send `X-Profile: 1` (or add `?_profile=1`) on any request as an admin -
+session or token - and ProfilingMiddleware runs that request under
+cProfile. The profile is saved to PROFILE_DIR as a .prof file (open it with
+snakeviz, `python -m pstats` or flameprof) next to a .json file with the
+request's method, path, route, status, user and wall time. The response
+carries the profile's name in X-Profile. GET /api/admin/profiles/ lists the
+stored profiles and /api/admin/profiles/<name>/ downloads one, or prints
+the top functions with ?report=1.
+
+Everyone else's flags are ignored. At most one request is profiled per
+PROFILE_MIN_INTERVAL seconds, across workers when the cache is shared, and
+one at a time per process; a refused admin request runs normally with
+`X-Profile: rate-limited`. Only the newest PROFILE_KEEP profiles are kept.
+
+Streaming responses such as the order export stay profiled while their
+body is produced. Under ASGI the profiler runs on the thread that executes
+sync views, so work that other requests do on that thread while this one
+is in flight shows up too; the profile's mode says "async" then.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+RESPONSE_HEADER = 'X-Profile'
+RATE_KEY = 'profiling:last-run'
+NAME = re.compile(r'^[\w-]+$')
+
+_active = threading.Lock()  # cProfile can't run two profilers at once in one process
+
+
+def requested(request):
+    return 'HTTP_X_PROFILE' in request.META or '_profile=' in request.META.get('QUERY_STRING', '')
+
+
+def is_admin(request):
+    """Whether the request comes from a staff user, by session or by DRF token"""
+    original = getattr(request, 'user', None)
+    if original is not None and original.is_staff:
+        return True
+    try:
+        user = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES]).user
+    except APIException:
+        return False
+    finally:
+        # DRF's Request overwrites request.user; the view authenticates again anyway
+        if original is not None:
+            request.user = original
+        else:
+            request.__dict__.pop('user', None)
+    return user.is_staff
+
+
+def claim():
+    """Take the global profiling slot; release it through Run.finish or Run.abandon"""
+    if not _active.acquire(blocking=False):
+        return False
+    if not cache.add(RATE_KEY, time.time(), timeout=settings.PROFILE_MIN_INTERVAL):
+        _active.release()
+        return False
+    return True
+
+
+class Run:
+    def __init__(self, request, mode='sync'):
+        self.request = request
+        self.mode = mode
+        self.profile = cProfile.Profile()
+        self.started = time.perf_counter()
+        slug = re.sub(r'\W+', '-', request.path).strip('-')[:60] or 'root'
+        self.name = f'{timezone.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}-{slug}'
+
+    def enable(self):
+        self.profile.enable()
+
+    def disable(self):
+        self.profile.disable()
+
+    def abandon(self):
+        self.profile.disable()
+        _active.release()
+
+    def finish(self, response):
+        """Save the profile now, or once a sync streaming body has been produced; returns the response"""
+        response[RESPONSE_HEADER] = self.name
+        if response.streaming and not getattr(response, 'is_async', False):
+            response.streaming_content = ProfiledStream(self, response)
+        else:
+            self.save(response)
+        return response
+
+    def save(self, response):
+        try:
+            os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+            base = os.path.join(settings.PROFILE_DIR, self.name)
+            self.profile.dump_stats(base + '.prof')
+            match = self.request.resolver_match
+            user = getattr(self.request, 'user', None)
+            with open(base + '.json', 'w', encoding='utf-8') as f:
+                json.dump({
+                    'name': self.name,
+                    'created_at': timezone.now().isoformat(),
+                    'method': self.request.method,
+                    'path': self.request.get_full_path(),
+                    'route': match.route if match is not None else None,
+                    'status': response.status_code,
+                    'seconds': round(time.perf_counter() - self.started, 6),
+                    'user': user.email if user is not None and user.is_authenticated else None,
+                    'mode': self.mode,
+                    'pid': os.getpid(),
+                }, f)
+            prune()
+        finally:
+            _active.release()
+
+
+class ProfiledStream:
+    """Profiles each chunk of a streaming body; Django calls close() when the response is done"""
+
+    def __init__(self, run, response):
+        self.run = run
+        self.response = response
+        self.content = response.streaming_content
+        self.iterator = None
+        self.saved = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        self.run.enable()
+        try:
+            if self.iterator is None:
+                self.iterator = iter(self.content)
+            return next(self.iterator)
+        finally:
+            self.run.disable()
+
+    def close(self):
+        if not self.saved:
+            self.saved = True
+            self.run.save(self.response)
+
+
+def list_profiles():
+    """Metadata of the stored profiles, newest first"""
+    try:
+        names = sorted((name for name in os.listdir(settings.PROFILE_DIR) if name.endswith('.json')), reverse=True)
+    except FileNotFoundError:
+        return []
+    profiles = []
+    for name in names:
+        try:
+            with open(os.path.join(settings.PROFILE_DIR, name), encoding='utf-8') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # Being written or pruned right now
+    return profiles
+
+
+def profile_path(name):
+    """Path of a stored .prof file, or None"""
+    if not NAME.match(name):
+        return None
+    path = os.path.join(settings.PROFILE_DIR, name + '.prof')
+    return path if os.path.exists(path) else None
+
+
+def report(path, sort='cumulative', limit=40):
+    stream = io.StringIO()
+    pstats.Stats(path, stream=stream).strip_dirs().sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def prune():
+    try:
+        names = sorted(name[:-5] for name in os.listdir(settings.PROFILE_DIR) if name.endswith('.json'))
+    except FileNotFoundError:
+        return
+    for name in names[:max(len(names) - settings.PROFILE_KEEP, 0)]:
+        for suffix in ('.json', '.prof'):
+            try:
+                os.remove(os.path.join(settings.PROFILE_DIR, name + suffix))
+            except FileNotFoundError:
+                pass
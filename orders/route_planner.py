@@ -0,0 +1,103 @@
+"""
+Rider batching and visit order for orders that are ready to go out.
+
+Stops are projected once onto a flat km grid around the restaurant, which
+is accurate to well under 1% at delivery distances, so every distance
+after that is a plain Euclidean one.
+
+Batching seeds each batch with the farthest unassigned stop from the
+restaurant and fills it with that stop's nearest unassigned neighbours, so
+outlying stops aren't left for last and batches stay compact. Each batch
+is then routed with nearest neighbour and improved with 2-opt over its
+own distance matrix. Routes are open: they start at the restaurant and
+end at the last stop.
+"""
+import heapq
+import math
+from itertools import combinations
+
+KM_PER_DEGREE_LAT = 110.574
+KM_PER_DEGREE_LNG = 111.320
+
+
+def project(origin, points):
+    """(lat, lng) pairs to (x, y) km offsets from `origin`"""
+    lat0, lng0 = origin
+    kx = KM_PER_DEGREE_LNG * math.cos(math.radians(lat0))
+    return [((float(lng) - lng0) * kx, (float(lat) - lat0) * KM_PER_DEGREE_LAT) for lat, lng in points]
+
+
+def distance_matrix(coords):
+    """Symmetric matrix of Euclidean distances, each pair computed once"""
+    size = len(coords)
+    matrix = [[0.0] * size for _ in range(size)]
+    for i, j in combinations(range(size), 2):
+        matrix[i][j] = matrix[j][i] = math.dist(coords[i], coords[j])
+    return matrix
+
+
+def cluster_batches(coords, capacity):
+    """Split stop indexes into batches of at most `capacity` nearby stops"""
+    left = set(range(len(coords)))
+    batches = []
+    while left:
+        seed = max(left, key=lambda i: math.hypot(*coords[i]))
+        sx, sy = coords[seed]
+        batch = heapq.nsmallest(capacity, left, key=lambda i: (coords[i][0] - sx) ** 2 + (coords[i][1] - sy) ** 2)
+        left.difference_update(batch)
+        batches.append(batch)
+    return batches
+
+
+def route_length(route, matrix):
+    return sum(matrix[a][b] for a, b in zip(route, route[1:]))
+
+
+def nearest_neighbour(matrix):
+    """Open tour over matrix nodes starting at node 0 (the restaurant)"""
+    route, left = [0], set(range(1, len(matrix)))
+    while left:
+        row = matrix[route[-1]]
+        nearest = min(left, key=row.__getitem__)
+        route.append(nearest)
+        left.remove(nearest)
+    return route
+
+
+def two_opt(route, matrix):
+    """Reverse segments while that shortens the open route; node 0 stays first"""
+    route = list(route)
+    last = len(route) - 1
+    improved = True
+    while improved:
+        improved = False
+        for i in range(1, last):
+            a, b = route[i - 1], route[i]
+            for j in range(i + 1, last + 1):
+                c = route[j]
+                d = route[j + 1] if j < last else None
+                before = matrix[a][b] + (matrix[c][d] if d is not None else 0.0)
+                after = matrix[a][c] + (matrix[b][d] if d is not None else 0.0)
+                if after < before - 1e-9:
+                    route[i:j + 1] = reversed(route[i:j + 1])
+                    b = route[i]
+                    improved = True
+    return route
+
+
+def plan_routes(origin, stops, capacity):
+    """
+    Batch and route `stops`, a list of dicts with 'latitude' and 'longitude'.
+
+    Returns [{'stops': [stop, ...] in visit order, 'distance_km': float}].
+    """
+    coords = project(origin, [(stop['latitude'], stop['longitude']) for stop in stops])
+    plans = []
+    for batch in cluster_batches(coords, capacity):
+        matrix = distance_matrix([(0.0, 0.0)] + [coords[i] for i in batch])
+        route = two_opt(nearest_neighbour(matrix), matrix)
+        plans.append({
+            'stops': [stops[batch[node - 1]] for node in route[1:]],
+            'distance_km': round(route_length(route, matrix), 2),
+        })
+    return plans
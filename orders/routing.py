@@ -2,5 +2,5 @@ from django.urls import re_path
 from . import consumers
 
 websocket_urlpatterns = [
-    re_path(r'ws/orders/$', consumers.OrderUpdateConsumer.as_view()),
-]
\ No newline at end of file
+    re_path(r'ws/orders/$', consumers.OrderUpdateConsumer.as_asgi()),
+]
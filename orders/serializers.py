@@ -1,5 +1,8 @@
 from rest_framework import serializers
-from .models import CustomUser, MenuItem, Order, DeliveryStatus
+from . import checkout
+from .cart import MAX_QUANTITY
+from .models import CustomUser, MenuItem, Order, OrderLine, DeliveryStatus
+from .menu_cache import get_price_table
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,10 +23,11 @@ class LoginSerializer(serializers.Serializer):
 class MenuItemSerializer(serializers.ModelSerializer):
     # This will return the full Cloudinary URL
     image_url = serializers.SerializerMethodField()
+    sold_out = serializers.SerializerMethodField()
     
     class Meta:
         model = MenuItem
-        fields = ['id', 'name', 'description', 'price', 'image', 'image_url', 'category']
+        fields = ['id', 'name', 'description', 'price', 'image', 'image_url', 'category', 'sold_out']
         extra_kwargs = {
             'image': {'write_only': True}  # Accept uploads but don't return raw field
         }
@@ -34,6 +38,10 @@ class MenuItemSerializer(serializers.ModelSerializer):
             return obj.image.url
         return None
     
+    def get_sold_out(self, obj):
+        # Needs the stock_left annotation from menu_queryset(); untracked items are None
+        return getattr(obj, 'stock_left', None) == 0
+
     def create(self, validated_data):
         """Handle image upload when creating menu item"""
         return super().create(validated_data)
@@ -43,8 +51,23 @@ class MenuItemSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
     
 
+class OrderLineSerializer(serializers.ModelSerializer):
+    """Renders an order line as its menu item with the ordered quantity and price"""
+
+    class Meta:
+        model = OrderLine
+        fields = ['quantity']
+
+    def to_representation(self, instance):
+        line = super().to_representation(instance)
+        data = MenuItemSerializer(instance.menu_item, context=self.context).data
+        data['quantity'] = line['quantity']
+        data['price'] = float(instance.unit_price)  # A number, as items_data entries always rendered it
+        return data
+
+
 class OrderSerializer(serializers.ModelSerializer):
-    items = MenuItemSerializer(many=True, read_only=True)
+    items = OrderLineSerializer(source='lines', many=True, read_only=True)
     items_ids = serializers.PrimaryKeyRelatedField(queryset=MenuItem.objects.all(), many=True, write_only=True, source='items')
     user_name = serializers.CharField(source='user.name', read_only=True, default='Unknown')
     delivery_charge = serializers.SerializerMethodField()
@@ -57,28 +80,43 @@ class OrderSerializer(serializers.ModelSerializer):
         read_only_fields = ['user', 'status', 'total_price', 'created_at']  # Don't include latitude/longitude here!
     
     def get_delivery_charge(self, obj):
-        return 50.00
+        return float(obj.delivery_charge)
+
+    def validate_items_data(self, value):
+        if not isinstance(value, list):
+            raise serializers.ValidationError('Expected a list of {id, quantity} entries')
+        try:
+            checkout.quantities_from_items_data(value)
+        except checkout.CheckoutError as e:
+            raise serializers.ValidationError(str(e))
+        return value
     
-    def to_representation(self, instance):
-        data = super().to_representation(instance)
-        # Add quantities and prices from items_data
-        items_data = instance.items_data
-        if items_data:
-            data['items'] = [
-                {**item, 'quantity': next((i['quantity'] for i in items_data if i['id'] == item['id']), 1),
-                 'price': next((i['price'] for i in items_data if i['id'] == item['id']), item['price'])}
-                for item in data['items']
-            ]
-        return data
+    def create(self, validated_data):
+        order = super().create(validated_data)
+        order.rebuild_lines()
+        return order
+
+    def update(self, instance, validated_data):
+        order = super().update(instance, validated_data)
+        if 'items_data' in validated_data or 'items' in validated_data:
+            order.rebuild_lines()
+        return order
         
 class AdminOrderSerializer(serializers.ModelSerializer):  # New serializer for admin updates
-    items = MenuItemSerializer(many=True, read_only=True)
-    items_ids = serializers.PrimaryKeyRelatedField(queryset=MenuItem.objects.all(), many=True, write_only=True, source='items')
+    items = OrderLineSerializer(source='lines', many=True, read_only=True)  # Fixed once the order is placed
 
     class Meta:
         model = Order
-        fields = ['id', 'user', 'items', 'items_ids', 'status', 'total_price', 'created_at', 'phone', 'location','latitude','longitude']
-        read_only_fields = ['user', 'total_price', 'created_at']  # Status is writable for admins
+        fields = ['id', 'user', 'items', 'status', 'version', 'total_price', 'created_at', 'phone', 'location','latitude','longitude']
+        read_only_fields = ['user', 'version', 'total_price', 'created_at']  # Status is writable for admins
+
+    def update(self, instance, validated_data):
+        # Status and version only move through order_status's conditional UPDATE, never a row save
+        fields = [name for name in validated_data if name not in ('status', 'version')]
+        for name in fields:
+            setattr(instance, name, validated_data[name])
+        instance.save(update_fields=fields)
+        return instance
 
 
 
@@ -86,4 +124,65 @@ class AdminOrderSerializer(serializers.ModelSerializer):  # New serializer for a
 class DeliveryStatusSerializer(serializers.ModelSerializer):
     class Meta:
         model = DeliveryStatus
-        fields = ['available', 'updated_at']
\ No newline at end of file
+        fields = ['available', 'updated_at']
+
+
+class CartLineSerializer(serializers.Serializer):
+    item_id = serializers.IntegerField()
+    name = serializers.CharField(read_only=True)
+    quantity = serializers.IntegerField(min_value=0, max_value=MAX_QUANTITY, default=1)
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    line_total = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    def validate_item_id(self, value):
+        # Checked against the cached price table, not a per-item query
+        if value not in get_price_table():
+            raise serializers.ValidationError('Unknown menu item')
+        return value
+
+
+class CartSerializer(serializers.Serializer):
+    items = CartLineSerializer(many=True)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+
+
+class CartCheckoutSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Order
+        fields = ['phone', 'location', 'latitude', 'longitude']
+
+
+class OrderContactSerializer(serializers.ModelSerializer):
+    """What a customer may still change on a pending order; the rest decides its price"""
+    class Meta:
+        model = Order
+        fields = ['phone', 'location']
+
+
+class BulkOrderStatusSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=500)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
+
+class DeliveryPointSerializer(serializers.Serializer):
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+
+
+class DeliveryQuoteSerializer(serializers.Serializer):
+    """Either a single latitude/longitude or up to 100 `points` to quote in one call"""
+    latitude = serializers.FloatField(min_value=-90, max_value=90, required=False)
+    longitude = serializers.FloatField(min_value=-180, max_value=180, required=False)
+    points = DeliveryPointSerializer(many=True, required=False, max_length=100)
+
+    def validate(self, data):
+        single = 'latitude' in data and 'longitude' in data
+        if single == ('points' in data):
+            raise serializers.ValidationError('Send either latitude and longitude, or points')
+        return data
+
+
+class ItemStockSerializer(serializers.Serializer):
+    stock = serializers.IntegerField(min_value=0, allow_null=True)
+    slots = serializers.IntegerField(min_value=1, max_value=16, default=1)
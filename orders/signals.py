@@ -0,0 +1,46 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import admission, metrics, slow_queries
+from .authentication import invalidate_token, invalidate_user_tokens
+from .delivery_status_cache import publish_delivery_status
+from .menu_cache import bump_menu_version
+from .models import CustomUser, DeliveryStatus, MenuItem
+
+
+@receiver(post_save, sender=MenuItem)
+@receiver(post_delete, sender=MenuItem)
+def invalidate_menu_cache(sender, **kwargs):
+    # Bump after commit so a concurrent reader can't cache the old rows under the new version
+    transaction.on_commit(bump_menu_version)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    key = instance.key  # The key is the pk, which Django clears once the delete finishes
+    transaction.on_commit(lambda: invalidate_token(key))
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidate_cached_user_tokens(sender, instance, created, **kwargs):
+    # Covers deactivation and admin/staff flag changes
+    if not created:
+        user_id = instance.pk
+        transaction.on_commit(lambda: invalidate_user_tokens(user_id))
+
+
+@receiver(post_save, sender=DeliveryStatus)
+def invalidate_delivery_status(sender, instance, **kwargs):
+    # Covers DeliveryStatusView PATCH and DeliveryStatusAdmin
+    transaction.on_commit(lambda: publish_delivery_status(instance))
+    transaction.on_commit(lambda: admission.delivery_status_saved(instance))
+
+
+# Per-request DB query counts for the metrics endpoint
+connection_created.connect(metrics.install_query_hook, dispatch_uid='orders.metrics.install_query_hook')
+
+# Slow-query log, when SLOW_QUERY_LOG is on
+connection_created.connect(slow_queries.install, dispatch_uid='orders.slow_queries.install')
@@ -0,0 +1,179 @@
+"""
+Opt-in slow-query log.
+
+With SLOW_QUERY_LOG on, an execute wrapper on every DB connection records
+queries slower than SLOW_QUERY_THRESHOLD_MS, plus a random
+SLOW_QUERY_SAMPLE_RATE share of the rest. Each record has the SQL, a
+fingerprint (the SQL with literals and IN lists collapsed, so the same ORM
+call always groups together), the duration, the nearest project frame
+that issued it (e.g. orders/views.py:210 in get_queryset) and, for
+SELECTs, the EXPLAIN plan. Plans are captured at most once per
+fingerprint per SLOW_QUERY_EXPLAIN_INTERVAL seconds so a hot slow query
+doesn't double its own cost. Inside a transaction the EXPLAIN runs in a
+savepoint, so a failing one can't abort the caller's transaction.
+
+Records go to an in-process ring buffer (GET /api/admin/slow-queries/) and
+to a size-rotated JSONL file that the summarize_slow_queries command reads.
+"""
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import nullcontext
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import metrics
+
+_explaining = ContextVar('slow_query_explaining', default=False)
+_buffer = None
+_buffer_lock = threading.Lock()
+_last_explained = OrderedDict()  # fingerprint -> when; least recently explained first
+_explained_lock = threading.Lock()
+_file_logger = None
+
+PROJECT_ROOT = str(settings.BASE_DIR) + os.sep
+WRAPPER_FILES = {__file__, metrics.__file__}  # Execute wrappers sit between Django and the caller
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """Normalised SQL and a short hash of it"""
+    normalised = STRING_LITERAL.sub('?', sql)
+    normalised = NUMBER_LITERAL.sub('?', normalised)
+    normalised = IN_LIST.sub('IN (...)', normalised.replace('%s', '?'))
+    normalised = WHITESPACE.sub(' ', normalised).strip()
+    return normalised, hashlib.sha1(normalised.encode()).hexdigest()[:12]
+
+
+def call_site():
+    """The innermost stack frame in this project's code, skipping Django and the execute wrappers"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(PROJECT_ROOT) and filename not in WRAPPER_FILES and os.sep + 'site-packages' + os.sep not in filename:
+            return f'{os.path.relpath(filename, PROJECT_ROOT)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return 'unknown'
+
+
+def recent(limit=None):
+    with _buffer_lock:
+        records = list(_buffer or ())
+    return records[-limit:] if limit else records
+
+
+def clear():
+    """Empty the ring buffer and reopen the log file on the next record"""
+    global _buffer, _file_logger
+    with _buffer_lock:
+        _buffer = deque(maxlen=settings.SLOW_QUERY_BUFFER_SIZE)
+    with _explained_lock:
+        _last_explained.clear()
+    if _file_logger is not None:
+        for handler in _file_logger.handlers:
+            handler.close()
+        _file_logger.handlers = []
+        _file_logger = None
+
+
+def _store(record):
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = deque(maxlen=settings.SLOW_QUERY_BUFFER_SIZE)
+        _buffer.append(record)
+    logger = _get_file_logger()
+    if logger is not None:
+        logger.info(json.dumps(record, default=str))
+
+
+def _get_file_logger():
+    global _file_logger
+    if _file_logger is None and settings.SLOW_QUERY_LOG_FILE:
+        os.makedirs(os.path.dirname(settings.SLOW_QUERY_LOG_FILE) or '.', exist_ok=True)
+        handler = RotatingFileHandler(
+            settings.SLOW_QUERY_LOG_FILE,
+            maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+            backupCount=settings.SLOW_QUERY_LOG_BACKUPS,
+            encoding='utf-8',
+        )
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger = logging.getLogger('orders.slow_queries.file')
+        logger.handlers = [handler]
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        _file_logger = logger
+    return _file_logger
+
+
+def _due_for_plan(digest):
+    """Claim the next plan for `digest` if its interval has passed; remembers as many fingerprints as the buffer holds"""
+    now = time.monotonic()
+    with _explained_lock:
+        if now - _last_explained.get(digest, float('-inf')) < settings.SLOW_QUERY_EXPLAIN_INTERVAL:
+            return False
+        _last_explained[digest] = now
+        _last_explained.move_to_end(digest)
+        while len(_last_explained) > settings.SLOW_QUERY_BUFFER_SIZE:
+            _last_explained.popitem(last=False)
+    return True
+
+
+def _explain(connection, sql, params, digest):
+    if not _due_for_plan(digest):
+        return None
+    token = _explaining.set(True)
+    try:
+        with transaction.atomic(using=connection.alias) if connection.in_atomic_block else nullcontext():
+            with connection.cursor() as cursor:
+                cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}', params)
+                return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except Exception as e:  # A plan is nice to have; never fail the request over it
+        return f'EXPLAIN failed: {e}'
+    finally:
+        _explaining.reset(token)
+
+
+def _hook(execute, sql, params, many, context):
+    if _explaining.get():
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    result = execute(sql, params, many, context)
+    duration_ms = (time.perf_counter() - started) * 1000
+    if duration_ms < settings.SLOW_QUERY_THRESHOLD_MS and random.random() >= settings.SLOW_QUERY_SAMPLE_RATE:
+        return result
+    normalised, digest = fingerprint(sql)
+    plan = None
+    if settings.SLOW_QUERY_EXPLAIN and not many and sql.lstrip()[:6].upper() == 'SELECT':
+        plan = _explain(context['connection'], sql, params, digest)
+    _store({
+        'at': timezone.now().isoformat(),
+        'fingerprint': digest,
+        'sql': normalised,
+        'duration_ms': round(duration_ms, 3),
+        'slow': duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS,
+        'call_site': call_site(),
+        'database': context['connection'].alias,
+        'plan': plan,
+    })
+    return result
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver; does nothing unless SLOW_QUERY_LOG is on"""
+    if settings.SLOW_QUERY_LOG and _hook not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_hook)
@@ -1,6 +1,1480 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import warnings
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.contrib import admin as django_admin
+from django.contrib.auth.signals import user_login_failed
+from django.core.cache import cache, caches
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import Q
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
+from resturant_site.asgi import application
+from . import admission, exports, hashing, idempotency, inventory, kitchen, metrics, order_status, profiling, route_planner, slow_queries
+from . import cart as cart_module
+from . import checkout as checkout_module
+from .delivery import DeliveryZone
+from .events import ORDER_CREATED, send_order_events
+from .middleware import RequestMetricsMiddleware
+from .models import CartItem, CustomUser, DailyItemSales, DeliveryStatus, HourlySales, ItemStock, MenuItem, Order, OrderArchive, OrderLine
+from .serializers import AdminOrderSerializer
 
-#this is the test file required 
+
+def menu_item(name='Momo', price='150.00', **fields):
+    return MenuItem.objects.create(name=name, description='', price=Decimal(price), **fields)
+
+
+class OrdersTestCase(TestCase):
+    """Empty caches, an API client, a customer (`user`) and a staff user (`admin`)"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = CustomUser.objects.create_user('user@example.com', 'User')
+        self.admin = CustomUser.objects.create_superuser('admin@example.com', 'Admin', 'pass')
+
+    def as_user(self):
+        self.client.force_authenticate(self.user)
+
+    def as_admin(self):
+        self.client.force_authenticate(self.admin)
+
+
+class MenuCacheTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        menu_item()
+
+    def test_menu_is_served_from_cache(self):
+        self.client.get('/api/menu/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/menu/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+        self.assertIn('ETag', response)
+        self.assertIn('Last-Modified', response)
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get('/api/menu/')['ETag']
+        response = self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_admin_change_bumps_version(self):
+        etag = self.client.get('/api/menu/')['ETag']
+        self.as_admin()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/admin/menu/', {
+                'name': 'Chowmein', 'description': 'Fried', 'price': '120.00', 'category': 'VEG',
+            })
+        response = self.client.get('/api/menu/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 2)
+
+
+class OrderListQueryBudgetTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.menu = [menu_item(f'Item {i}', '100.00') for i in range(3)]
+
+    def create_orders(self, count, user=None):
+        for _ in range(count):
+            owner = user or CustomUser.objects.create_user(
+                f'user{CustomUser.objects.count()}@example.com', 'User'
+            )
+            order = Order.objects.create(
+                user=owner, total_price=Decimal('350.00'),
+                items_data=[{'id': item.id, 'quantity': 1, 'price': 100} for item in self.menu],
+            )
+            order.items.set(self.menu)
+            order.rebuild_lines()
+
+    def assert_constant_queries(self, url, user, budget, owner=None):
+        self.client.force_authenticate(user)
+        for count in (1, 20):
+            self.create_orders(count, owner)
+            with self.assertNumQueries(budget):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+
+    def test_admin_order_list_query_budget(self):
+        self.assert_constant_queries('/api/admin/orders/', self.admin, 2)
+
+    def test_user_order_list_query_budget(self):
+        self.assert_constant_queries('/api/orders/', self.admin, 2, owner=self.admin)
+
+
+class OrderLineTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.as_user()
+        self.momo, self.coke = menu_item(), menu_item('Coke', '60.00')
+
+    def test_create_order_writes_lines(self):
+        response = self.client.post('/api/orders/', {
+            'items_ids': [self.momo.id, self.coke.id],
+            'items_data': [
+                {'id': self.momo.id, 'quantity': 2, 'price': 150},
+                {'id': self.coke.id, 'quantity': 3, 'price': 55},
+            ],
+            'total_price': '515.00',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(
+            sorted(order.lines.values_list('menu_item_id', 'quantity', 'unit_price')),
+            [(self.momo.id, 2, Decimal('150.00')), (self.coke.id, 3, Decimal('60.00'))],
+        )
+        items = {item['id']: item for item in response.json()['items']}
+        self.assertEqual(items[self.coke.id]['quantity'], 3)
+        # Client prices and totals are ignored in favour of the menu
+        self.assertEqual(items[self.coke.id]['price'], 60.0)
+        self.assertEqual(order.total_price, Decimal('530.00'))
+
+    def test_backfill_survives_malformed_legacy_entries(self):
+        from importlib import import_module
+        from django.apps import apps
+        backfill = import_module('orders.migrations.0033_backfill_orderlines').backfill_order_lines
+        order = Order.objects.create(user=self.user, total_price=Decimal('0.00'), items_data=[
+            {'id': self.momo.id, 'quantity': 'x', 'price': 'free'},
+            {'id': self.coke.id, 'quantity': 2, 'price': 55},
+            {'id': 'junk'},
+        ])
+        backfill(apps, None)
+        self.assertEqual(
+            sorted(order.lines.values_list('menu_item_id', 'quantity', 'unit_price')),
+            [(self.momo.id, 1, Decimal('150.00')), (self.coke.id, 2, Decimal('55.00'))],
+        )
+
+    def test_admin_cannot_change_items_of_a_placed_order(self):
+        order_id = self.client.post('/api/orders/', {
+            'items_ids': [self.momo.id], 'items_data': [{'id': self.momo.id, 'quantity': 2}],
+        }, format='json').json()['id']
+        self.as_admin()
+        for data in ({'items_ids': [self.coke.id]}, {'items_data': [{'id': self.coke.id, 'quantity': 1}], 'phone': '1'}):
+            response = self.client.patch(f'/api/admin/orders/{order_id}/', data, format='json')
+            self.assertEqual(response.status_code, 400, data)
+        order = Order.objects.get()
+        self.assertEqual(list(order.items.values_list('id', flat=True)), [self.momo.id])
+        self.assertEqual(list(order.lines.values_list('menu_item_id', 'quantity')), [(self.momo.id, 2)])
+        self.assertIsNone(order.phone)  # Nothing else in the request was applied either
+
+    def test_malformed_items_data_is_rejected(self):
+        for items_data in ({'id': self.momo.id}, [{'id': self.momo.id, 'quantity': 'two'}], ['momo']):
+            response = self.client.post('/api/orders/', {'items_data': items_data, 'items_ids': []}, format='json')
+            self.assertEqual(response.status_code, 400, items_data)
+            self.assertIn('items_data', response.json())
+        self.assertFalse(Order.objects.exists())
+
+    def test_rebuild_lines_tolerates_bad_stored_values(self):
+        order = Order.objects.create(user=self.user, total_price=Decimal('150.00'), items_data=[
+            {'id': self.momo.id, 'quantity': 'two', 'price': 'free'},
+            {'id': self.coke.id, 'quantity': -3, 'price': 1e12},
+        ])
+        order.rebuild_lines()
+        self.assertEqual(
+            sorted(order.lines.values_list('menu_item_id', 'quantity', 'unit_price')),
+            [(self.momo.id, 1, Decimal('150.00')), (self.coke.id, 1, Decimal('60.00'))],
+        )
+
+    def test_rebuild_lines_falls_back_to_items(self):
+        order = Order.objects.create(user=self.user, total_price=Decimal('150.00'))
+        order.items.set([self.momo])
+        order.rebuild_lines()
+        line = order.lines.get()
+        self.assertEqual((line.menu_item, line.quantity, line.unit_price), (self.momo, 1, Decimal('150.00')))
+
+
+class OrderIndexTests(TestCase):
+    def test_active_index_predicate_matches_active_statuses(self):
+        [index] = [index for index in Order._meta.indexes if index.name == 'order_active_created_idx']
+        self.assertEqual(index.condition, Q(status__in=Order.ACTIVE_STATUSES))
+
+
+class OrderExportTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.as_admin()
+        momo = menu_item()
+        for status in ('PENDING', 'DELIVERED', 'CANCELLED'):
+            order = Order.objects.create(
+                user=self.admin, status=status, total_price=Decimal('200.00'),
+                items_data=[{'id': momo.id, 'quantity': 2, 'price': 150}],
+            )
+            order.rebuild_lines()
+
+    def read(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_csv_export_is_streamed_and_filtered(self):
+        response = self.client.get('/api/admin/orders/download/', {'status': 'pending,delivered'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = self.read(response).decode().splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('Momo', lines[1])
+
+    def test_ndjson_gzip_export(self):
+        response = self.client.get('/api/admin/orders/download/', {
+            'export_format': 'ndjson', 'gzip': '1', 'from': '2000-01-01', 'to': '2999-12-31',
+        })
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        rows = [json.loads(line) for line in gzip.decompress(self.read(response)).splitlines()]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]['items'][0]['quantity'], 2)
+
+    def test_bad_filter_is_rejected(self):
+        response = self.client.get('/api/admin/orders/download/', {'status': 'LOST'})
+        self.assertEqual(response.status_code, 400)
+
+
+class AsgiOrderExportTests(TransactionTestCase):
+    # ASGI requests run on their own thread and connection, so the rows must be committed
+    def setUp(self):
+        admin = CustomUser.objects.create_superuser('admin@example.com', 'Admin', 'pass')
+        self.token = Token.objects.create(user=admin)
+        for _ in range(3):
+            Order.objects.create(user=admin, total_price=Decimal('200.00'))
+
+    async def test_asgi_export_is_streamed_not_collected(self):
+        communicator = ApplicationCommunicator(application, {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': '/api/admin/orders/download/', 'raw_path': b'/api/admin/orders/download/',
+            'query_string': b'export_format=ndjson', 'client': ('127.0.0.1', 5000), 'server': ('testserver', 80),
+            'headers': [(b'host', b'testserver'), (b'authorization', f'Token {self.token.key}'.encode())],
+        })
+        with warnings.catch_warnings(record=True) as caught, mock.patch.object(exports, 'ASYNC_BATCH_CHUNKS', 1):
+            warnings.simplefilter('always')
+            await communicator.send_input({'type': 'http.request', 'body': b''})
+            start = await communicator.receive_output(5)
+            bodies = []
+            while True:
+                message = await communicator.receive_output(5)
+                bodies.append(message.get('body', b''))
+                if not message.get('more_body'):
+                    break
+        self.assertEqual(start['status'], 200)
+        self.assertEqual(len(b''.join(bodies).splitlines()), 3)
+        self.assertGreaterEqual(len([body for body in bodies if body]), 3)  # One message per row, as produced
+        self.assertFalse([w for w in caught if 'consume synchronous iterators' in str(w.message)])
+
+
+class OrderPaginationTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.as_admin()
+        Order.objects.bulk_create([Order(user=self.admin, total_price=Decimal('1.00')) for _ in range(7)])
+
+    def test_cursor_pages_cover_every_order_once(self):
+        seen = []
+        url = '/api/admin/orders/?page_size=3'
+        while url:
+            with self.assertNumQueries(2):
+                page = self.client.get(url).json()
+            seen.extend(order['id'] for order in page['results'])
+            url = page['next']
+        self.assertEqual(seen, list(Order.objects.order_by('-created_at', '-id').values_list('id', flat=True)))
+
+    def test_admin_menu_is_page_numbered(self):
+        menu_item()
+        page = self.client.get('/api/admin/menu/').json()
+        self.assertEqual(page['count'], 1)
+        self.assertEqual(len(page['results']), 1)
+
+
+class OrderUpdateConsumerTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = CustomUser.objects.create_user('alice@example.com', 'Alice')
+        self.bob = CustomUser.objects.create_user('bob@example.com', 'Bob')
+        self.tokens = {user: Token.objects.create(user=user).key for user in (self.admin, self.alice, self.bob)}
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(application, f'/ws/orders/?token={self.tokens[user]}')
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_events_fan_out_to_admins_and_owner(self):
+        admin, alice, bob = [await self.connect(user) for user in (self.admin, self.alice, self.bob)]
+        payload = {'id': 1, 'user': self.alice.id, 'status': 'PENDING'}
+        await sync_to_async(send_order_events)(ORDER_CREATED, [payload])
+
+        for communicator in (admin, alice):
+            message = await communicator.receive_json_from()
+            self.assertEqual(message, {'event': ORDER_CREATED, 'orders': [payload]})
+        self.assertTrue(await bob.receive_nothing())
+        for communicator in (admin, alice, bob):
+            await communicator.disconnect()
+
+    async def test_anonymous_connection_is_rejected(self):
+        communicator = WebsocketCommunicator(application, '/ws/orders/')
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+
+class CachedTokenAuthenticationTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_repeat_requests_skip_the_token_query(self):
+        self.client.get('/api/auth/me/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/auth/me/')
+        self.assertEqual(response.json()['email'], 'user@example.com')
+
+    def test_deactivation_invalidates(self):
+        self.assertEqual(self.client.get('/api/auth/me/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/api/auth/me/').status_code, 401)
+
+    def test_invalidation_reaches_other_workers(self):
+        from . import authentication
+        from .local_cache import LocalLRUCache
+        workers = [LocalLRUCache(100, 300), LocalLRUCache(100, 300)]  # Each process's own LRU
+
+        def get_as(worker):
+            with mock.patch.object(authentication, 'local_tokens', worker):
+                return self.client.get('/api/auth/me/').status_code
+
+        self.assertEqual([get_as(worker) for worker in workers], [200, 200])
+        with mock.patch.object(authentication, 'local_tokens', workers[1]):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.is_active = False
+                self.user.save()
+        self.assertEqual(len(workers[0]), 1)  # Worker 0 never heard about it locally...
+        self.assertEqual(get_as(workers[0]), 401)  # ...but the new stamp rejects its copy
+
+    def test_token_deletion_invalidates(self):
+        self.assertEqual(self.client.get('/api/auth/me/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(self.client.get('/api/auth/me/').status_code, 401)
+
+
+class AsyncAuthViewTests(TransactionTestCase):
+    """Logins authenticate on the hashing pool's threads, which need committed users"""
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        CustomUser.objects.create_superuser('admin@example.com', 'Admin', 'pass')
+
+    def test_register_then_login(self):
+        response = self.client.post('/api/auth/register/', {
+            'email': 'new@example.com', 'name': 'New', 'password': 's3cret-pass',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(CustomUser.objects.get(email='new@example.com').check_password('s3cret-pass'))
+
+        response = self.client.post('/api/auth/login/', {
+            'email': 'new@example.com', 'password': 's3cret-pass',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['name'], 'New')
+
+        response = self.client.post('/api/auth/login/', {'email': 'new@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_login_goes_through_the_auth_backends(self):
+        CustomUser.objects.filter(email='admin@example.com').update(is_active=False)
+        failed = []
+        user_login_failed.connect(lambda sender, credentials, **kwargs: failed.append(credentials), weak=False, dispatch_uid='test-login-failed')
+        self.addCleanup(user_login_failed.disconnect, dispatch_uid='test-login-failed')
+        response = self.client.post('/api/auth/login/', {'email': 'admin@example.com', 'password': 'pass'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(failed[0]['email'], 'admin@example.com')
+
+    @override_settings(AUTH_HASH_QUEUE_TIMEOUT=0.05)
+    def test_queued_login_gives_up_at_the_timeout(self):
+        started = threading.Event()
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def block():
+            started.set()
+            release.wait(5)
+
+        for _ in range(settings.AUTH_HASH_CONCURRENCY):
+            hashing._executor.submit(block)  # Occupy every hashing thread
+        started.wait(1)
+        response = self.client.post('/api/auth/login/', {'email': 'admin@example.com', 'password': 'pass'})
+        self.assertEqual(response.status_code, 503)
+
+    @override_settings(AUTH_HASH_QUEUE_TIMEOUT=-1)
+    def test_queue_timeout_returns_503(self):
+        response = self.client.post('/api/auth/login/', {'email': 'admin@example.com', 'password': 'pass'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+
+
+class DeliveryStatusCacheTests(OrdersTestCase):
+    def test_steady_state_reads_skip_the_database(self):
+        self.client.get('/api/admin/delivery-status/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/admin/delivery-status/')
+        self.assertTrue(response.json()['available'])
+        etag = response['ETag']
+        self.assertEqual(self.client.get('/api/admin/delivery-status/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_patch_publishes_new_version(self):
+        etag = self.client.get('/api/admin/delivery-status/')['ETag']
+        self.as_admin()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/admin/delivery-status/', {'available': False})
+        response = self.client.get('/api/admin/delivery-status/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['available'])
+        self.assertFalse(DeliveryStatus.objects.get().available)
+
+
+class CartApiTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.as_user()
+        self.momo, self.coke = menu_item(), menu_item('Coke', '60.00')
+
+    def test_add_increments_and_prices_from_table(self):
+        self.client.post('/api/cart/items/', {'item_id': self.momo.id, 'quantity': 1})
+        response = self.client.post('/api/cart/items/', {'item_id': self.momo.id, 'quantity': 2})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['items'][0]['quantity'], 3)
+        self.assertEqual(response.json()['subtotal'], '450.00')
+        with self.assertNumQueries(1):
+            self.client.get('/api/cart/')
+
+    def test_repeated_adds_stop_at_the_maximum(self):
+        for _ in range(3):
+            response = self.client.post('/api/cart/items/', {'item_id': self.momo.id, 'quantity': 40})
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['items'][0]['quantity'], cart_module.MAX_QUANTITY)
+        self.assertEqual(CartItem.objects.get().quantity, 99)
+
+    def test_sync_replaces_cart_with_one_upsert(self):
+        CartItem.objects.create(user=self.user, item=self.momo, quantity=5)
+        with CaptureQueriesContext(connection) as queries:
+            cart_module.sync_cart(self.user, {self.coke.id: 2, self.momo.id: 1})
+        statements = [q['sql'].split()[0] for q in queries if 'SAVEPOINT' not in q['sql']]
+        self.assertEqual(statements, ['INSERT', 'DELETE'])  # one upsert + one delete of dropped lines
+        response = self.client.put('/api/cart/', {'items': [{'item_id': self.coke.id, 'quantity': 4}]}, format='json')
+        self.assertEqual(
+            [(line['item_id'], line['quantity']) for line in response.json()['items']],
+            [(self.coke.id, 4)],
+        )
+
+    def test_set_remove_and_clear(self):
+        self.client.patch(f'/api/cart/items/{self.momo.id}/', {'quantity': 2})
+        self.client.patch(f'/api/cart/items/{self.coke.id}/', {'quantity': 1})
+        response = self.client.patch(f'/api/cart/items/{self.momo.id}/', {'quantity': 0})
+        self.assertEqual(len(response.json()['items']), 1)
+        self.client.delete(f'/api/cart/items/{self.coke.id}/')
+        self.assertFalse(CartItem.objects.exists())
+        self.client.post('/api/cart/items/', {'item_id': self.coke.id})
+        self.assertEqual(self.client.delete('/api/cart/').status_code, 204)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_unknown_item_is_rejected(self):
+        response = self.client.post('/api/cart/items/', {'item_id': 999})
+        self.assertEqual(response.status_code, 400)
+
+
+class CartCheckoutTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.as_user()
+        self.menu = [menu_item(f'Item {i}', f'{100 + i}.00') for i in range(6)]
+
+    def fill_cart(self, count):
+        CartItem.objects.bulk_create([CartItem(user=self.user, item=item, quantity=2) for item in self.menu[:count]])
+
+    def test_checkout_prices_on_server_and_clears_cart(self):
+        self.fill_cart(2)
+        response = self.client.post('/api/cart/checkout/', {'phone': '9800000000', 'location': 'Home'})
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get()
+        self.assertEqual(order.total_price, Decimal('452.00'))  # 2 x 100 + 2 x 101 + 50 delivery
+        self.assertEqual(order.lines.count(), 2)
+        self.assertEqual(order.items.count(), 2)
+        self.assertFalse(CartItem.objects.exists())
+        self.assertEqual(self.client.post('/api/cart/checkout/').status_code, 400)
+
+    def test_checkout_query_count_is_bounded(self):
+        checkout_module.get_price_table()
+        kitchen.rebuild()  # Admission control builds the load counters on first use
+        counts = []
+        for size in (1, 6):
+            self.fill_cart(size)
+            with CaptureQueriesContext(connection) as queries:
+                checkout_module.checkout_cart(self.user)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class CheckoutUpdateTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.as_user()
+        momo = menu_item()
+        CartItem.objects.create(user=self.user, item=momo, quantity=2)
+        self.order = checkout_module.checkout_cart(self.user, phone='9800000000', location='Home')
+
+    def test_contact_details_can_change(self):
+        response = self.client.patch(f'/api/orders/{self.order.id}/checkout/', {'phone': '9811111111', 'location': 'Office'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['phone'], response.json()['location']), ('9811111111', 'Office'))
+        self.assertEqual(response.json()['items'][0]['quantity'], 2)
+
+    def test_priced_fields_are_fixed_after_checkout(self):
+        for data in ({'items_data': [{'id': 1, 'quantity': 50}]}, {'latitude': 27.7, 'longitude': 85.3}, {'items_ids': []}):
+            response = self.client.patch(f'/api/orders/{self.order.id}/checkout/', data, format='json')
+            self.assertEqual(response.status_code, 400, data)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.total_price, Decimal('350.00'))
+        self.assertEqual(self.order.lines.get().quantity, 2)
+
+
+class CartCheckoutConcurrencyTests(TransactionTestCase):
+    @skipUnlessDBFeature('has_select_for_update')  # SQLite has no row locks to test
+    def test_parallel_submits_create_one_order(self):
+        user = CustomUser.objects.create_user('user@example.com', 'User')
+        item = menu_item()
+        CartItem.objects.create(user=user, item=item, quantity=1)
+        barrier = threading.Barrier(4)
+        outcomes = []
+
+        def submit():
+            barrier.wait()
+            try:
+                checkout_module.checkout_cart(user)
+                outcomes.append('ok')
+            except checkout_module.CheckoutError as e:
+                outcomes.append(str(e))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=submit) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # The losers waited on the user row lock and then found the cart emptied
+        self.assertEqual(sorted(outcomes), ['Cart is empty'] * 3 + ['ok'])
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class IdempotencyKeyTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        caches['idempotency'].clear()
+        self.as_user()
+        self.momo = menu_item()
+        self.body = {'items_ids': [self.momo.id], 'items_data': [{'id': self.momo.id, 'quantity': 1}]}
+
+    def post(self, body, key='abc-123'):
+        return self.client.post('/api/orders/', body, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_stored_response(self):
+        first = self.post(self.body)
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(0):
+            retry = self.post(self.body)
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json()['id'], first.json()['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_new_key_creates_new_order(self):
+        self.post(self.body)
+        self.post(self.body, key='other')
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_reuse_with_different_body_is_rejected(self):
+        self.post(self.body)
+        response = self.post({**self.body, 'phone': '9800000000'})
+        self.assertEqual(response.status_code, 422)
+
+    def test_lock_is_only_released_by_its_holder(self):
+        store = caches['idempotency']
+        store.set('lock:x', 'later-request')  # Ours expired and someone else took it
+        idempotency._release(store, 'lock:x', 'expired-request')
+        self.assertEqual(store.get('lock:x'), 'later-request')
+        idempotency._release(store, 'lock:x', 'later-request')
+        self.assertIsNone(store.get('lock:x'))
+
+
+class IdempotencyConcurrencyTests(TransactionTestCase):
+    def test_concurrent_duplicates_create_one_order(self):
+        caches['idempotency'].clear()
+        user = CustomUser.objects.create_user('user@example.com', 'User')
+        momo = menu_item()
+        body = {'items_ids': [momo.id], 'items_data': [{'id': momo.id, 'quantity': 1}]}
+        price_lines = checkout_module.price_lines
+
+        def slow_price_lines(quantities):
+            time.sleep(0.2)  # Keep the first request inside the lock while the second arrives
+            return price_lines(quantities)
+
+        barrier = threading.Barrier(2)
+        responses = []
+
+        def submit():
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                responses.append(client.post('/api/orders/', body, format='json', HTTP_IDEMPOTENCY_KEY='same'))
+            finally:
+                connection.close()
+
+        with mock.patch.object(checkout_module, 'price_lines', slow_price_lines):
+            threads = [threading.Thread(target=submit) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual([response.status_code for response in responses], [201, 201])
+        self.assertEqual(len({response.json()['id'] for response in responses}), 1)
+        self.assertEqual(sum(response.has_header('Idempotent-Replayed') for response in responses), 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+
+class SalesAnalyticsTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.momo, self.coke = menu_item(), menu_item('Coke', '60.00')
+
+    def place(self, *quantities):
+        self.as_user()
+        items = [item for item, quantity in zip((self.momo, self.coke), quantities) if quantity]
+        response = self.client.post('/api/orders/', {
+            'items_ids': [item.id for item in items],
+            'items_data': [{'id': item.id, 'quantity': q} for item, q in zip((self.momo, self.coke), quantities) if q],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['id']
+
+    def report(self):
+        self.as_admin()
+        response = self.client.get('/api/admin/analytics/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_report_tracks_creates_and_status_changes(self):
+        self.place(2, 1)  # 300 + 60 + 50
+        cancelled = self.place(0, 5)  # 300 + 50
+        self.as_admin()
+        self.client.patch(f'/api/admin/orders/{cancelled}/', {'status': 'CANCELLED'}, format='json')
+
+        report = self.report()
+        self.assertEqual(report['orders_by_status'], {'PENDING': 1, 'CANCELLED': 1})
+        [day] = report['revenue_by_day']
+        self.assertEqual((day['orders'], day['revenue']), (1, '410.00'))
+        self.assertEqual(
+            [(row['name'], row['units']) for row in report['top_items_by_units']],
+            [('Momo', 2), ('Coke', 1)],
+        )
+        self.assertEqual(report['top_items_by_revenue'][0]['revenue'], '300.00')
+
+    def test_report_reads_rollups_not_orders(self):
+        for _ in range(3):
+            self.place(1, 1)
+        self.as_admin()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/admin/analytics/')
+        self.assertFalse([q for q in queries if '"orders_order"' in q['sql']])
+
+    def test_delete_removes_order_from_rollups(self):
+        order_id = self.place(1, 0)
+        self.as_admin()
+        self.client.delete(f'/api/admin/orders/{order_id}/delete/')
+        report = self.report()
+        self.assertEqual(report['revenue_by_day'], [])
+        self.assertEqual(report['top_items_by_units'], [])
+
+    def test_rebuild_matches_incremental_rollups(self):
+        self.place(2, 1)
+        cancelled = self.place(1, 0)
+        Order.objects.filter(id=cancelled).update(status='CANCELLED')  # Bypasses lifecycle
+        call_command('rebuild_sales_rollups', batch_size=1, stdout=open('/dev/null', 'w'))
+        report = self.report()
+        self.assertEqual(report['orders_by_status'], {'PENDING': 1, 'CANCELLED': 1})
+        self.assertEqual(report['top_items_by_units'][0]['units'], 2)
+
+    def test_rebuild_keeps_archived_orders(self):
+        self.place(1, 0)
+        OrderArchive.objects.create(
+            order_id=999, user_id=self.user.id, status='DELIVERED', total_price=Decimal('170.00'),
+            created_at=timezone.now() - timedelta(hours=1),
+            data={'lines': [{'menu_item': self.coke.id, 'quantity': 2, 'unit_price': '60.00'}]},
+        )
+        call_command('rebuild_sales_rollups', stdout=open('/dev/null', 'w'))
+        report = self.report()
+        self.assertEqual(report['orders_by_status'], {'PENDING': 1, 'DELIVERED': 1})
+        self.assertEqual(sum(Decimal(day['revenue']) for day in report['revenue_by_day']), Decimal('370.00'))
+        self.assertEqual({row['name']: row['units'] for row in report['top_items_by_units']}, {'Momo': 1, 'Coke': 2})
+
+    def test_failed_rebuild_leaves_the_old_rollups(self):
+        self.place(2, 1)
+        before = self.report()
+        with mock.patch.object(DailyItemSales.objects, 'bulk_create', side_effect=OperationalError('disk full')):
+            with self.assertRaises(OperationalError):
+                call_command('rebuild_sales_rollups', stdout=open('/dev/null', 'w'))
+        self.assertEqual(self.report(), before)
+
+    def test_bad_dates_are_rejected(self):
+        self.as_admin()
+        self.assertEqual(self.client.get('/api/admin/analytics/?from=yesterday').status_code, 400)
+        self.assertEqual(self.client.get('/api/admin/analytics/?from=2024-02-01&to=2024-01-01').status_code, 400)
+
+
+@override_settings(
+    RESTAURANT_LATITUDE=27.7172, RESTAURANT_LONGITUDE=85.3240, DELIVERY_TIERS='3:50,6:80,10:120', DELIVERY_ZONE='',
+)
+class DeliveryPricingTests(OrdersTestCase):
+    # An L-shaped (concave) zone around the restaurant
+    ZONE = '27.66,85.27;27.66,85.38;27.70,85.38;27.70,85.33;27.77,85.33;27.77,85.27'
+
+    def setUp(self):
+        super().setUp()
+        self.as_user()
+        self.momo = menu_item()
+
+    def order(self, latitude, longitude):
+        return self.client.post('/api/orders/', {
+            'items_ids': [self.momo.id],
+            'items_data': [{'id': self.momo.id, 'quantity': 1}],
+            'latitude': latitude,
+            'longitude': longitude,
+        }, format='json')
+
+    def test_grid_index_matches_plain_ray_cast(self):
+        import random
+        zone = DeliveryZone.parse(self.ZONE)
+        rng = random.Random(7)
+        for _ in range(5000):
+            lat, lng = rng.uniform(27.64, 27.79), rng.uniform(85.25, 85.40)
+            self.assertEqual(zone.contains(lat, lng), DeliveryZone._ray_cast(lng, lat, zone.edges), (lat, lng))
+
+    def test_charge_follows_distance_tiers(self):
+        near = self.order('27.7200', '85.3250')
+        self.assertEqual(near.status_code, 201)
+        self.assertEqual((near.json()['delivery_charge'], near.json()['total_price']), (50.0, '200.00'))
+        farther = self.order('27.7600', '85.3240')  # ~4.5 km north
+        self.assertEqual(farther.json()['delivery_charge'], 80.0)
+        self.assertEqual(self.order('27.9000', '85.3240').status_code, 400)  # ~20 km
+
+    def test_orders_without_coordinates_pay_base_charge(self):
+        response = self.client.post('/api/orders/', {'items_ids': [self.momo.id]}, format='json')
+        self.assertEqual(response.json()['delivery_charge'], 50.0)
+
+    def test_zone_rejects_in_range_address_outside_polygon(self):
+        with override_settings(DELIVERY_ZONE=self.ZONE):
+            self.assertEqual(self.order('27.7300', '85.3600').status_code, 400)  # Notch of the L, ~3.6 km
+            self.assertEqual(self.order('27.7300', '85.3000').status_code, 201)
+
+    def test_quote_endpoint_single_and_batch(self):
+        client = APIClient()
+        single = client.post('/api/delivery/quote/', {'latitude': 27.72, 'longitude': 85.325}, format='json')
+        self.assertEqual(single.status_code, 200)
+        self.assertTrue(single.json()['deliverable'])
+        batch = client.post('/api/delivery/quote/', {'points': [
+            {'latitude': 27.72, 'longitude': 85.325},
+            {'latitude': 27.90, 'longitude': 85.324},
+        ]}, format='json')
+        self.assertEqual([q['deliverable'] for q in batch.json()['quotes']], [True, False])
+        self.assertEqual(client.post('/api/delivery/quote/', {'latitude': 27.72}, format='json').status_code, 400)
+
+
+@override_settings(RESTAURANT_LATITUDE=27.7172, RESTAURANT_LONGITUDE=85.3240)
+class DispatchPlanTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.as_admin()
+
+    def test_two_opt_uncrosses_route(self):
+        # Depot then the corners of a square visited in a crossing order
+        coords = [(0, 0), (1, 0), (2, 1), (2, 0), (1, 1)]
+        matrix = route_planner.distance_matrix(coords)
+        route = route_planner.two_opt([0, 1, 2, 3, 4], matrix)
+        self.assertLess(route_planner.route_length(route, matrix), route_planner.route_length([0, 1, 2, 3, 4], matrix))
+        self.assertEqual(route[0], 0)
+
+    def test_plan_covers_every_stop_within_capacity(self):
+        import random
+        rng = random.Random(3)
+        stops = [
+            {'id': i, 'latitude': 27.7172 + rng.uniform(-0.05, 0.05), 'longitude': 85.3240 + rng.uniform(-0.05, 0.05)}
+            for i in range(500)
+        ]
+        plans = route_planner.plan_routes((27.7172, 85.3240), stops, 6)
+        self.assertTrue(all(len(plan['stops']) <= 6 for plan in plans))
+        self.assertEqual(sorted(stop['id'] for plan in plans for stop in plan['stops']), list(range(500)))
+
+    def test_dispatch_endpoint_batches_ready_orders(self):
+        def order(status, latitude=None, longitude=None):
+            return Order.objects.create(
+                user=self.user, total_price=Decimal('100.00'), status=status, latitude=latitude, longitude=longitude,
+            ).id
+
+        north = [order('ACCEPTED', '27.7500', '85.3240'), order('DELIVERYOUT', '27.7520', '85.3250')]
+        south = [order('ACCEPTED', '27.6900', '85.3240')]
+        order('PENDING', '27.7510', '85.3240')
+        missing = order('ACCEPTED')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/admin/dispatch/?capacity=2')
+        self.assertEqual(response.status_code, 200)
+        batches = sorted(sorted(stop['id'] for stop in batch['stops']) for batch in response.json()['batches'])
+        self.assertEqual(batches, sorted([sorted(north), south]))
+        self.assertEqual(response.json()['without_coordinates'], [missing])
+        self.assertEqual(self.client.get('/api/admin/dispatch/?capacity=0').status_code, 400)
+
+
+class KitchenBoardTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.momo = menu_item(category='CHICKEN')
+        self.coke = menu_item('Coke', '60.00', category='DRINKS')
+
+    def place(self, momos, cokes):
+        self.as_user()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/orders/', {
+                'items_ids': [self.momo.id, self.coke.id],
+                'items_data': [{'id': self.momo.id, 'quantity': momos}, {'id': self.coke.id, 'quantity': cokes}],
+            }, format='json')
+        return response.json()['id']
+
+    def set_status(self, order_id, new_status):
+        self.as_admin()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/admin/orders/{order_id}/', {'status': new_status}, format='json')
+
+    def board(self):
+        self.as_admin()
+        return self.client.get('/api/admin/kitchen/').json()
+
+    def test_board_follows_creates_and_transitions(self):
+        first = self.place(2, 1)
+        self.board()  # Builds the counters
+        second = self.place(3, 2)
+        self.assertEqual(self.board()['categories'], {'CHICKEN': 5, 'DRINKS': 3})
+        self.set_status(first, 'ACCEPTED')
+        self.assertEqual(self.board()['categories'], {'CHICKEN': 5, 'DRINKS': 3})
+        self.set_status(first, 'DELIVERYOUT')
+        self.set_status(second, 'CANCELLED')
+        self.assertEqual(self.board(), {'items': [], 'categories': {}})
+        self.set_status(self.place(3, 0), 'ACCEPTED')
+        self.assertEqual(self.board()['items'][0], {'id': self.momo.id, 'name': 'Momo', 'category': 'CHICKEN', 'units': 3})
+
+    def test_board_reads_counters_not_orders(self):
+        self.place(2, 1)
+        self.board()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get('/api/admin/kitchen/')
+        self.assertFalse([q for q in queries if 'orders_orderline' in q['sql']])
+
+    def test_reconcile_corrects_drift(self):
+        self.place(2, 1)
+        kitchen.rebuild()
+        cache.set(kitchen._key(self.momo.id), 40)
+        with self.assertLogs('orders.kitchen', 'WARNING'):
+            self.assertEqual(kitchen.reconcile(), {kitchen._key(self.momo.id): (40, 2)})
+        self.assertEqual(kitchen.reconcile(), {})
+
+    def test_reconcile_keeps_concurrent_increments(self):
+        self.place(2, 1)
+        kitchen.rebuild()
+        key = kitchen._key(self.momo.id)
+        cache.set(key, 40)
+
+        def order_lands_meanwhile(*args):
+            cache.incr(key, 3)  # An order committing between reconcile's read and its fix
+
+        with mock.patch.object(kitchen.logger, 'warning', side_effect=order_lands_meanwhile):
+            kitchen.reconcile()
+        self.assertEqual(cache.get(key), 5)
+
+
+@override_settings(ADMISSION_MAX_ORDERS=2, ADMISSION_MAX_UNITS=0, ADMISSION_RESUME_RATIO=0.5, ADMISSION_RETRY_AFTER=90)
+class AdmissionControlTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.momo = menu_item()
+
+    def place(self):
+        self.as_user()
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/orders/', {'items_ids': [self.momo.id]}, format='json')
+
+    def cancel(self, order_id):
+        self.as_admin()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/admin/orders/{order_id}/', {'status': 'CANCELLED'}, format='json')
+
+    def test_full_kitchen_rejects_and_closes_until_load_drops(self):
+        first = self.place().json()['id']
+        self.assertTrue(DeliveryStatus.get_status().available)
+        self.place()
+        self.assertFalse(DeliveryStatus.get_status().available)
+
+        rejected = self.place()
+        self.assertEqual(rejected.status_code, 503)
+        self.assertEqual(rejected['Retry-After'], '90')
+        self.assertEqual(Order.objects.count(), 2)
+
+        self.cancel(first)  # 1 outstanding is at the 50% resume mark
+        self.assertTrue(DeliveryStatus.get_status().available)
+        self.assertEqual(self.place().status_code, 201)
+
+    def test_manual_closure_is_left_alone(self):
+        status = DeliveryStatus.get_status()
+        status.available = False
+        with self.captureOnCommitCallbacks(execute=True):
+            status.save()
+        order_id = self.place().json()['id']
+        self.cancel(order_id)
+        self.assertFalse(DeliveryStatus.get_status().available)
+
+    def test_concurrent_admissions_never_exceed_cap(self):
+        kitchen.rebuild()
+        admitted, release = [], threading.Event()
+
+        def attempt():
+            try:
+                with admission.admit(1):
+                    admitted.append(1)
+                    release.wait(5)  # Hold the slot until every thread has tried
+            except admission.KitchenBusy:
+                pass
+
+        threads = [threading.Thread(target=attempt) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        while sum(thread.is_alive() for thread in threads) > 2:
+            time.sleep(0.01)
+        release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(admitted), 2)
+        self.assertEqual(cache.get(admission.RESERVED_ORDERS_KEY), 0)
+
+
+class InventoryTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.as_user()
+        self.momo, self.coke = menu_item(), menu_item('Coke', '60.00')
+
+    def order(self, momos):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/orders/', {
+                'items_ids': [self.momo.id, self.coke.id],
+                'items_data': [{'id': self.momo.id, 'quantity': momos}, {'id': self.coke.id, 'quantity': 1}],
+            }, format='json')
+
+    def sold_out(self):
+        return {item['name']: item['sold_out'] for item in self.client.get('/api/menu/').json()}
+
+    def test_orders_take_stock_until_sold_out(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.set_stock(self.momo.id, 3, slots=2)
+        self.assertEqual(self.sold_out(), {'Momo': False, 'Coke': False})
+        self.assertEqual(self.order(2).status_code, 201)  # Needs both slots when they hold 2 and 1
+
+        rejected = self.order(2)
+        self.assertEqual(rejected.status_code, 400)
+        self.assertEqual(rejected.json()['error'], 'Sold out: Momo')
+        self.assertEqual(Order.objects.count(), 1)
+
+        self.assertEqual(self.order(1).status_code, 201)
+        self.assertEqual(self.sold_out(), {'Momo': True, 'Coke': False})  # Cached menu was invalidated
+
+    def test_cancelling_returns_stock(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.set_stock(self.momo.id, 3)
+        single, bulk = self.order(2).json()['id'], self.order(1).json()['id']
+        self.assertEqual(self.sold_out()['Momo'], True)
+        self.as_admin()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/admin/orders/{single}/', {'status': 'CANCELLED'}, format='json')
+        self.assertEqual(inventory.stock_levels([self.momo.id]), {self.momo.id: (2, 1)})
+        self.assertEqual(self.sold_out()['Momo'], False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/admin/orders/bulk/', {'ids': [single, bulk], 'status': 'CANCELLED'}, format='json')
+        self.assertEqual(inventory.stock_levels([self.momo.id]), {self.momo.id: (3, 1)})  # Not twice for `single`
+
+    def test_deleting_returns_stock_unless_already_cancelled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            inventory.set_stock(self.momo.id, 10)
+        pending, cancelled = self.order(3).json()['id'], self.order(2).json()['id']
+        self.as_admin()
+        self.client.patch(f'/api/admin/orders/{cancelled}/', {'status': 'CANCELLED'}, format='json')
+        self.assertEqual(inventory.stock_levels([self.momo.id]), {self.momo.id: (7, 1)})
+        for order_id in (pending, cancelled):
+            self.assertEqual(self.client.delete(f'/api/admin/orders/{order_id}/delete/').status_code, 204)
+        self.assertEqual(inventory.stock_levels([self.momo.id]), {self.momo.id: (10, 1)})
+
+    def test_menu_flags_cost_no_extra_queries(self):
+        inventory.set_stock(self.momo.id, 0)
+        with self.assertNumQueries(1):
+            self.client.get('/api/menu/')
+
+    def test_admin_sets_and_clears_stock(self):
+        self.as_admin()
+        url = f'/api/admin/menu/{self.momo.id}/stock/'
+        self.assertEqual(self.client.put(url, {'stock': 10, 'slots': 4}, format='json').status_code, 200)
+        self.assertEqual(sorted(ItemStock.objects.values_list('quantity', flat=True)), [2, 2, 3, 3])
+        self.assertEqual(self.client.get(url).json(), {'id': self.momo.id, 'stock': 10, 'slots': 4})
+        self.client.put(url, {'stock': None}, format='json')
+        self.assertFalse(ItemStock.objects.exists())
+
+
+class InventoryConcurrencyTests(TransactionTestCase):
+    def test_concurrent_orders_never_oversell(self):
+        item = menu_item()
+        inventory.set_stock(item.id, 20, slots=4)
+        attempts = [1, 2, 3] * 10  # 60 units wanted, 20 in stock
+        barrier = threading.Barrier(len(attempts))
+        sold, lock = [], threading.Lock()
+
+        def buy(quantity):
+            barrier.wait()
+            try:
+                for _ in range(500):
+                    try:
+                        with transaction.atomic():
+                            inventory.take({item.id: quantity})
+                    except OperationalError:  # SQLite refuses concurrent writers outright; retry
+                        time.sleep(0.001)
+                        continue
+                    with lock:
+                        sold.append(quantity)
+                    return
+            except inventory.OutOfStock:
+                pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy, args=(quantity,)) for quantity in attempts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        left = sum(ItemStock.objects.filter(menu_item=item).values_list('quantity', flat=True))
+        self.assertLessEqual(sum(sold), 20)
+        self.assertGreaterEqual(sum(sold), 19)  # Whatever is left must be too little for every refused request
+        self.assertEqual(left, 20 - sum(sold))
+
+
+class OrderStatusTransitionTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.as_admin()
+        self.order = Order.objects.create(user=self.user, total_price=Decimal('100.00'))
+
+    def patch(self, body):
+        return self.client.patch(f'/api/admin/orders/{self.order.id}/', body, format='json')
+
+    def test_status_only_patch_is_a_single_conditional_update(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch({'status': 'ACCEPTED', 'version': 0})
+        self.assertEqual(response.json(), {'id': self.order.id, 'status': 'ACCEPTED', 'version': 1})
+        writes = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "orders_order"')]
+        self.assertEqual(len(writes), 1)
+        self.assertIn('"version" = ', writes[0].split('WHERE')[1])
+
+    def test_stale_version_and_illegal_transitions_conflict(self):
+        self.patch({'status': 'ACCEPTED'})
+        stale = self.patch({'status': 'CANCELLED', 'version': 0})
+        self.assertEqual(stale.status_code, 409)
+        self.assertEqual(self.patch({'status': 'CANCELLED'}).status_code, 200)
+        illegal = self.patch({'status': 'PAID'})
+        self.assertEqual(illegal.status_code, 409)
+        self.assertIn('cannot go from CANCELLED to PAID', illegal.json()['error'])
+        self.assertEqual(self.patch({'status': 'NOPE'}).status_code, 400)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version), ('CANCELLED', 2))
+
+    def test_racing_writer_loses_at_the_update(self):
+        real_sources = order_status.sources
+
+        def accept_first(new_status):
+            # Someone else accepts the order between our read and our UPDATE
+            Order.objects.filter(id=self.order.id).update(status='ACCEPTED', version=1)
+            return real_sources(new_status)
+
+        with mock.patch.object(order_status, 'sources', accept_first):
+            with self.assertRaises(order_status.StatusConflict):
+                order_status.change_status(self.order.id, 'CANCELLED')
+        self.order.refresh_from_db()
+        self.assertNotEqual(self.order.status, 'CANCELLED')  # The racing write shares our rolled-back transaction here
+
+    def test_mixed_patch_checks_transition_and_saves_other_fields(self):
+        response = self.patch({'status': 'ACCEPTED', 'phone': '9800000000'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['status'], response.json()['version']), ('ACCEPTED', 1))
+        self.assertEqual(self.patch({'status': 'PENDING', 'phone': '9811111111'}).status_code, 409)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.phone, '9800000000')
+
+    def test_mixed_patch_does_not_undo_a_concurrent_status_change(self):
+        real_change_status = order_status.change_status
+
+        def then_dispatched(order_id, new_status, **kwargs):
+            order = real_change_status(order_id, new_status, **kwargs)
+            real_change_status(order_id, 'DELIVERYOUT')  # Another admin, before our other fields are saved
+            return order
+
+        with mock.patch.object(order_status, 'change_status', then_dispatched):
+            response = self.patch({'status': 'ACCEPTED', 'version': '0', 'phone': '9800000000'})
+        self.assertEqual(response.status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version, self.order.phone), ('DELIVERYOUT', 2, '9800000000'))
+
+    def test_admin_field_edit_keeps_status_changed_since_the_form_loaded(self):
+        model_admin = django_admin.site._registry[Order]
+        request = RequestFactory().post('/admin/orders/order/')
+        request.user = self.admin
+        stale = Order.objects.get(pk=self.order.pk)
+        order_status.change_status(self.order.id, 'ACCEPTED')  # Another writer
+        form = model_admin.get_form(request, stale, change=True)(
+            {'status': 'PENDING', 'phone': '9800000000', 'location': ''}, instance=stale,
+        )
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.changed_data, ['phone'])
+        model_admin.save_model(request, form.save(commit=False), form, change=True)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version, self.order.phone), ('ACCEPTED', 1, '9800000000'))
+
+    def test_form_encoded_mixed_patch_reads_the_version(self):
+        response = self.client.patch(
+            f'/api/admin/orders/{self.order.id}/', {'status': 'ACCEPTED', 'version': 0, 'phone': '9800000000'}, format='multipart',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['version'], 1)
+
+    def test_field_patch_keeps_status_changed_since_the_read(self):
+        def accepted_meanwhile(serializer, attrs):
+            order_status.change_status(self.order.id, 'ACCEPTED')  # After the view read the order
+            return attrs
+
+        with mock.patch.object(AdminOrderSerializer, 'validate', accepted_meanwhile):
+            self.assertEqual(self.patch({'location': 'Office'}).status_code, 200)
+        self.order.refresh_from_db()
+        self.assertEqual((self.order.status, self.order.version, self.order.location), ('ACCEPTED', 1, 'Office'))
+
+
+class BulkOrderStatusTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.as_admin()
+
+    def orders(self, count, status='DELIVERYOUT'):
+        return [Order.objects.create(user=self.user, total_price=Decimal('100.00'), status=status).id for _ in range(count)]
+
+    def bulk(self, ids, new_status='DELIVERED'):
+        return self.client.patch('/api/admin/orders/bulk/', {'ids': ids, 'status': new_status}, format='json')
+
+    def test_applies_allowed_transitions_and_reports_the_rest(self):
+        out = self.orders(3)
+        paid = self.orders(1, 'PAID')
+        with mock.patch('orders.events.send_order_events') as send:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.bulk(out + paid + [999999])
+        body = response.json()
+        self.assertEqual(body['updated'], 3)
+        self.assertEqual(body['results'][0], {'id': out[0], 'status': 'DELIVERED', 'version': 1})
+        self.assertEqual(body['results'][3], {'id': paid[0], 'error': 'Cannot go from PAID to DELIVERED'})
+        self.assertEqual(body['results'][4], {'id': 999999, 'error': 'Order not found'})
+        self.assertEqual(Order.objects.filter(status='DELIVERED').count(), 3)
+        # One batch of events, not one per order
+        send.assert_called_once()
+        self.assertEqual(len(send.call_args.args[1]), 3)
+
+    def test_query_count_does_not_grow_with_ids(self):
+        counts = []
+        for size in (2, 40):
+            ids = self.orders(size)
+            with CaptureQueriesContext(connection) as queries:
+                self.bulk(ids)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_rejects_bad_payloads(self):
+        self.assertEqual(self.bulk([], 'DELIVERED').status_code, 400)
+        self.assertEqual(self.bulk([1], 'NOPE').status_code, 400)
+
+
+class ArchiveOrdersTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.momo = menu_item()
+
+    def order(self, status, days_old):
+        order = Order.objects.create(user=self.user, total_price=Decimal('200.00'), status=status, phone='9800000000')
+        Order.objects.filter(id=order.id).update(created_at=order.created_at - timedelta(days=days_old))
+        OrderLine.objects.create(order=order, menu_item=self.momo, quantity=1, unit_price=Decimal('150.00'))
+        return order.id
+
+    def run_command(self, *args):
+        call_command('archive_orders', '--days', '30', '--batch-size', '2', '--sleep', '0', *args, stdout=open(os.devnull, 'w'))
+
+    def test_moves_old_finished_orders_in_batches(self):
+        old = [self.order('DELIVERED', 60), self.order('PAID', 90), self.order('CANCELLED', 45)]
+        recent = self.order('DELIVERED', 5)
+        active = self.order('PENDING', 120)
+        self.run_command()
+        self.assertEqual(sorted(Order.objects.values_list('id', flat=True)), sorted([recent, active]))
+        self.assertEqual(sorted(OrderArchive.objects.values_list('order_id', flat=True)), sorted(old))
+        archived = OrderArchive.objects.get(order_id=old[0])
+        self.assertEqual(archived.data['lines'], [{'menu_item': self.momo.id, 'quantity': 1, 'unit_price': '150.00'}])
+        self.assertEqual(archived.data['phone'], '9800000000')
+
+        self.run_command()  # Nothing left to do; safe to rerun
+        self.assertEqual(OrderArchive.objects.count(), 3)
+
+    def test_delete_cancelled_skips_the_archive(self):
+        self.order('CANCELLED', 60)
+        delivered = self.order('DELIVERED', 60)
+        self.run_command('--delete-cancelled')
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(list(OrderArchive.objects.values_list('order_id', flat=True)), [delivered])
+
+    def test_deleted_cancelled_orders_leave_the_rollups(self):
+        self.order('CANCELLED', 60)
+        self.order('DELIVERED', 60)
+        call_command('rebuild_sales_rollups', stdout=open(os.devnull, 'w'))
+        self.run_command('--delete-cancelled')
+
+        def rollups():
+            return sorted(HourlySales.objects.exclude(orders=0).values_list('status', 'orders', 'revenue'))
+
+        self.assertEqual(rollups(), [('DELIVERED', 1, Decimal('200.00'))])
+        call_command('rebuild_sales_rollups', stdout=open(os.devnull, 'w'))
+        self.assertEqual(rollups(), [('DELIVERED', 1, Decimal('200.00'))])  # A rebuild agrees
+
+
+class RequestMetricsTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+
+    def test_records_latency_queries_and_size_per_route(self):
+        menu_item()
+        self.client.get('/api/menu/')
+        self.as_admin()
+        response = self.client.get('/api/admin/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        labels = f'pid="{os.getpid()}",route="api/menu/",method="GET"'
+        self.assertIn(f'http_requests_total{{{labels},status="200"}} 1', body)
+        self.assertIn(f'http_request_duration_seconds_count{{{labels}}} 1', body)
+        self.assertIn(f'http_request_db_queries_bucket{{{labels},le="0"}} 0', body)  # The menu query was counted
+        self.assertIn(f'http_response_size_bytes_count{{{labels}}} 1', body)
+
+    def test_metrics_are_admin_only(self):
+        self.assertEqual(self.client.get('/api/admin/metrics/').status_code, 401)
+
+    def test_middleware_records_each_request_without_queries_of_its_own(self):
+        wrapped = RequestMetricsMiddleware(lambda request: HttpResponse('ok'))
+        with self.assertNumQueries(0):
+            for method in ('get', 'post', 'get'):
+                wrapped(getattr(RequestFactory(), method)('/nowhere/'))
+        self.assertEqual(metrics.registry.requests, {('unmatched', 'GET', '200'): 2, ('unmatched', 'POST', '200'): 1})
+        self.assertEqual(metrics.registry.response_size[('unmatched', 'GET')].total, 4)
+
+    def test_overhead_bench_measures_and_enforces_its_budget(self):
+        out = io.StringIO()
+        # A loose budget: this guards against gross regressions, not microseconds on a busy CI box
+        call_command('bench_metrics_middleware', requests=500, repeat=3, budget_us=1000, stdout=out)
+        self.assertRegex(out.getvalue(), r'overhead -?\d+\.\d+ us per request')
+        self.assertEqual(metrics.registry.requests, {})  # The bench doesn't leave numbers behind
+        with self.assertRaisesRegex(CommandError, 'over the'):
+            call_command('bench_metrics_middleware', requests=50, repeat=1, budget_us=-1e6, stdout=io.StringIO())
+
+    def test_unknown_methods_share_one_label(self):
+        wrapped = RequestMetricsMiddleware(lambda request: HttpResponse(status=405))
+        for method in ('BREW', 'PROPFIND', 'X' * 200):
+            wrapped(RequestFactory().generic(method, '/api/menu/'))
+        self.assertEqual(metrics.registry.requests, {('unmatched', 'other', '405'): 3})
+
+
+class SlowQueryLogTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.log_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.log_dir.cleanup)
+        self.log_file = os.path.join(self.log_dir.name, 'slow.jsonl')
+        overrides = override_settings(
+            SLOW_QUERY_LOG=True, SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_SAMPLE_RATE=0, SLOW_QUERY_LOG_FILE=self.log_file,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        slow_queries.clear()
+        self.addCleanup(slow_queries.clear)
+        slow_queries.install(None, connection)
+        self.addCleanup(connection.execute_wrappers.remove, slow_queries._hook)
+
+    def test_records_fingerprint_call_site_and_plan(self):
+        list(MenuItem.objects.filter(name='Momo'))
+        list(MenuItem.objects.filter(name='Chowmein'))
+        records = [r for r in slow_queries.recent() if 'orders_menuitem' in r['sql']]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]['fingerprint'], records[1]['fingerprint'])
+        self.assertTrue(records[0]['call_site'].startswith('orders/tests.py:'))
+        self.assertTrue(records[0]['plan'])
+        self.assertIsNone(records[1]['plan'])  # Explained once per interval, not per call
+        with open(self.log_file) as f:
+            logged = [json.loads(line) for line in f]
+        self.assertIn(records[0]['fingerprint'], {entry['fingerprint'] for entry in logged})
+
+    def test_failed_explain_is_contained_in_a_savepoint(self):
+        with mock.patch.object(connection.ops, 'explain_query_prefix', return_value='EXPLAIN NONSENSE'):
+            with CaptureQueriesContext(connection) as queries:
+                list(MenuItem.objects.filter(name='Momo'))
+        [record] = [r for r in slow_queries.recent() if 'orders_menuitem' in r['sql']]
+        self.assertTrue(record['plan'].startswith('EXPLAIN failed'))
+        self.assertTrue(any(q['sql'].startswith('ROLLBACK TO SAVEPOINT') for q in queries))
+        self.assertEqual(MenuItem.objects.count(), 0)  # The test's transaction is still usable
+
+    @override_settings(SLOW_QUERY_BUFFER_SIZE=2)
+    def test_explained_fingerprints_are_capped(self):
+        for digest in ('a', 'b', 'c', 'd'):
+            self.assertTrue(slow_queries._due_for_plan(digest))
+        self.assertFalse(slow_queries._due_for_plan('d'))
+        self.assertEqual(list(slow_queries._last_explained), ['c', 'd'])
+
+    def test_fingerprint_collapses_literals_and_in_lists(self):
+        a = slow_queries.fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = \'x\' LIMIT 21')
+        b = slow_queries.fingerprint('SELECT *  FROM t WHERE id IN (%s) AND name = \'y\' LIMIT 5')
+        self.assertEqual(a, b)
+        self.assertEqual(a[0], 'SELECT * FROM t WHERE id IN (...) AND name = ? LIMIT ?')
+
+    def test_fast_queries_are_skipped_unless_sampled(self):
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=10_000):
+            MenuItem.objects.count()
+            self.assertEqual(slow_queries.recent(), [])
+            with override_settings(SLOW_QUERY_SAMPLE_RATE=1.0):
+                MenuItem.objects.count()
+        self.assertEqual(len(slow_queries.recent()), 1)
+        self.assertFalse(slow_queries.recent()[0]['slow'])
+
+    def test_not_installed_when_disabled(self):
+        connection.execute_wrappers.remove(slow_queries._hook)
+        with override_settings(SLOW_QUERY_LOG=False):
+            slow_queries.install(None, connection)
+        self.assertNotIn(slow_queries._hook, connection.execute_wrappers)
+        connection.execute_wrappers.append(slow_queries._hook)  # For the cleanup
+
+    def test_summary_ranks_by_total_time(self):
+        entries = [
+            {'at': '2026-10-01T00:00:00', 'fingerprint': 'cheap', 'sql': 'SELECT 1', 'duration_ms': 5,
+             'slow': False, 'call_site': 'orders/views.py:1 in get', 'plan': None},
+        ] * 50 + [
+            {'at': '2026-10-01T00:00:00', 'fingerprint': 'slow', 'sql': 'SELECT 2', 'duration_ms': 200,
+             'slow': True, 'call_site': 'orders/admin.py:2 in get_queryset', 'plan': 'SCAN orders_order'},
+        ]
+        with open(self.log_file, 'w') as f:
+            f.writelines(json.dumps(entry) + '\n' for entry in entries)
+            f.write('{"truncated\n')
+        out = io.StringIO()
+        call_command('summarize_slow_queries', stdout=out)
+        output = out.getvalue()
+        self.assertLess(output.index('#1 cheap'), output.index('#2 slow'))
+        self.assertIn('from orders/views.py:1 in get (50x)', output)
+        self.assertIn('SCAN orders_order', output)
+        self.assertIn('1 unreadable lines skipped', output)
+        out = io.StringIO()
+        call_command('summarize_slow_queries', '--slow-only', stdout=out)
+        self.assertNotIn('cheap', out.getvalue())
+
+    def test_admin_endpoint_lists_recent_queries(self):
+        self.assertEqual(self.client.get('/api/admin/slow-queries/').status_code, 401)
+        self.as_admin()
+        MenuItem.objects.count()
+        response = self.client.get('/api/admin/slow-queries/?limit=5')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['enabled'])
+        self.assertLessEqual(len(response.data['queries']), 5)
+        self.assertTrue(response.data['queries'])
+
+
+class RequestProfilingTests(OrdersTestCase):
+    def setUp(self):
+        super().setUp()
+        self.profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.profile_dir.cleanup)
+        overrides = override_settings(PROFILE_DIR=self.profile_dir.name, PROFILE_MIN_INTERVAL=60, PROFILE_KEEP=50)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.token = Token.objects.create(user=self.admin)
+
+    def test_admin_token_request_is_profiled_and_listed(self):
+        menu_item()
+        response = self.client.get('/api/menu/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(response.status_code, 200)
+        name = response['X-Profile']
+        self.as_admin()
+        profiles = self.client.get('/api/admin/profiles/').data['profiles']
+        self.assertEqual([p['name'] for p in profiles], [name])
+        self.assertEqual(profiles[0]['route'], 'api/menu/')
+        self.assertEqual(profiles[0]['user'], 'admin@example.com')
+        self.assertEqual(profiles[0]['status'], 200)
+        download = self.client.get(f'/api/admin/profiles/{name}/')
+        self.assertEqual(download.status_code, 200)
+        self.assertTrue(b''.join(download.streaming_content))
+        report = self.client.get(f'/api/admin/profiles/{name}/', {'report': 1, 'sort': 'tottime'})
+        self.assertIn('function calls', report.content.decode())
+        self.assertEqual(self.client.get('/api/admin/profiles/nope/').status_code, 404)
+
+    def test_ignored_for_non_admins(self):
+        token = Token.objects.create(user=self.user)
+        response = self.client.get('/api/menu/?_profile=1', HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertNotIn('X-Profile', response)
+        self.assertNotIn('X-Profile', self.client.get('/api/menu/', HTTP_X_PROFILE='1'))
+        self.assertEqual(os.listdir(self.profile_dir.name), [])
+
+    def test_global_rate_limit(self):
+        self.as_admin()
+        first = self.client.get('/api/menu/?_profile=1', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        second = self.client.get('/api/menu/?_profile=1', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertNotEqual(first['X-Profile'], 'rate-limited')
+        self.assertEqual(second['X-Profile'], 'rate-limited')
+        self.assertEqual(second.status_code, 200)
+
+    def test_streaming_export_is_profiled_until_the_body_is_done(self):
+        Order.objects.create(user=self.admin, items_data=[], total_price=Decimal('10.00'), status='PENDING')
+        response = self.client.get('/api/admin/orders/download/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(os.listdir(self.profile_dir.name), [])  # Nothing saved until the body is consumed
+        b''.join(response.streaming_content)
+        response.close()
+        name = response['X-Profile']
+        self.assertEqual(sorted(os.listdir(self.profile_dir.name)), [f'{name}.json', f'{name}.prof'])
+        self.assertIn('export', profiling.report(profiling.profile_path(name)))
+        cache.clear()
+        self.assertNotEqual(  # The slot was released
+            self.client.get('/api/menu/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Token {self.token.key}')['X-Profile'],
+            'rate-limited',
+        )
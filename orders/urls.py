@@ -13,16 +13,31 @@ urlpatterns = [
     path('auth/login/', views.LoginView.as_view()),
     path('auth/me/', views.CurrentUserView.as_view()),
     path('menu/', views.MenuListView.as_view()),
+    path('cart/', views.CartView.as_view()),
+    path('cart/items/', views.CartItemAddView.as_view()),
+    path('cart/checkout/', views.CartCheckoutView.as_view()),
+    path('cart/items/<int:item_id>/', views.CartItemView.as_view()),
+    path('delivery/quote/', views.DeliveryQuoteView.as_view()),
     path('orders/', views.OrderListCreateView.as_view()),
     path('orders/<int:pk>/checkout/', views.CheckoutUpdateView.as_view()),
     path('admin/orders/', views.AdminOrderListView.as_view()),
+    path('admin/orders/bulk/', views.AdminOrderBulkStatusView.as_view()),
     path('admin/orders/<int:pk>/', views.AdminOrderUpdateView.as_view()),
     path('admin/orders/<int:pk>/delete/', views.AdminOrderDeleteView.as_view()),
     path('admin/orders/download/', views.DownloadOrdersView.as_view()),
+    path('admin/dispatch/', views.DispatchPlanView.as_view()),
+    path('admin/kitchen/', views.KitchenBoardView.as_view()),
     path('admin/menu/', views.AdminMenuListView.as_view()),  # Added: For adding menu items (POST)
     path('admin/menu/<int:pk>/delete/', views.AdminMenuDeleteView.as_view()), #for deleting the item 
     path('admin/menu/<int:pk>/', views.AdminMenuUpdateView.as_view()),  # Add this for PUT updates
+    path('admin/menu/<int:pk>/stock/', views.AdminMenuStockView.as_view()),
     path('admin/delivery-status/', views.DeliveryStatusView.as_view(), name='delivery-status'),
+    path('admin/auth-cache/', views.AuthCacheStatsView.as_view()),
+    path('admin/metrics/', views.MetricsView.as_view()),
+    path('admin/slow-queries/', views.SlowQueryLogView.as_view()),
+    path('admin/profiles/', views.ProfileListView.as_view()),
+    path('admin/profiles/<str:name>/', views.ProfileDetailView.as_view()),
+    path('admin/analytics/', views.SalesAnalyticsView.as_view()),
 ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT) + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
    
 
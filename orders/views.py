@@ -1,150 +1,326 @@
-import csv
-from django.http import HttpResponse
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch, Sum
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.dateparse import parse_date
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from rest_framework import generics, status
-from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.authtoken.models import Token
-from django.contrib.auth import authenticate
-from .models import MenuItem, Order, CustomUser
-from .serializers import UserSerializer, LoginSerializer, MenuItemSerializer, OrderSerializer, AdminOrderSerializer, DeliveryStatus, DeliveryStatusSerializer  # Added AdminOrderSerializer
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
 
+from . import (
+    admission, analytics, cart, checkout, delivery, exports, inventory, kitchen, lifecycle, metrics, order_status,
+    profiling, route_planner, slow_queries,
+)
+from .authentication import token_cache_stats
+from .delivery_status_cache import get_delivery_status
+from .hashing import HashQueueTimeout, run_hasher
+from .idempotency import idempotent
+from .menu_cache import get_menu_payload
+from .models import CustomUser, MenuItem, Order, OrderLine
+from .pagination import EstimatedCountPagination, OrderCursorPagination
+from .serializers import (
+    AdminOrderSerializer, BulkOrderStatusSerializer, CartCheckoutSerializer, CartLineSerializer, CartSerializer,
+    DeliveryQuoteSerializer, DeliveryStatus, DeliveryStatusSerializer, ItemStockSerializer, MenuItemSerializer,
+    OrderContactSerializer, OrderSerializer, UserSerializer,
+)
 
 
+def _auth_payload(token, user):
+    return {
+        'token': token.key,
+        'user': {
+            'email': user.email,
+            'name': user.name,
+            'is_admin': user.is_admin
+        }
+    }
 
-from django.core.mail import send_mail
-from django.conf import settings
-from django.utils import timezone
-from datetime import timedelta
-from decimal import Decimal
-import random
-from django.contrib.auth.hashers import make_password
 
-from rest_framework import generics, status
-from rest_framework.response import Response
-from rest_framework.authtoken.models import Token
-from django.contrib.auth.hashers import make_password
+def _request_data(request):
+    """Body of a plain (non-DRF) view: JSON or form-encoded, None if the JSON is malformed"""
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data if isinstance(data, dict) else None
+    return request.POST
 
-class RegisterView(generics.GenericAPIView):
-    serializer_class = UserSerializer
-    
-    def post(self, request):
-        email = request.data.get('email')
-        name = request.data.get('name')
-        password = request.data.get('password')
+
+def _hash_pool_busy():
+    response = JsonResponse(
+        {'error': 'Too many sign-ins right now, please retry'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+    response['Retry-After'] = str(settings.AUTH_HASH_QUEUE_TIMEOUT)
+    return response
+
+
+# Register and login are async views so PBKDF2 runs on the bounded hashing pool
+# (see hashing.py) instead of blocking a request worker.
+@method_decorator(csrf_exempt, name='dispatch')
+class RegisterView(View):
+    http_method_names = ['post']
+
+    async def post(self, request):
+        data = _request_data(request)
+        if data is None:
+            return JsonResponse({'error': 'Malformed JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+        email = data.get('email')
+        name = data.get('name')
+        password = data.get('password')
         
         # Validate required fields
         if not email or not name or not password:
-            return Response(
+            return JsonResponse(
                 {'error': 'Email, name, and password are required'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
         # Check if email already exists
-        if CustomUser.objects.filter(email=email).exists():
-            return Response(
+        if await CustomUser.objects.filter(email=email).aexists():
+            return JsonResponse(
                 {'error': 'Email already registered'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+        try:
+            password_hash = await run_hasher(make_password, password)
+        except HashQueueTimeout:
+            return _hash_pool_busy()
         
         # Create user directly
         try:
-            user = CustomUser.objects.create_user(
-                email=email,
+            user = await CustomUser.objects.acreate(
+                email=CustomUser.objects.normalize_email(email),
                 name=name,
-                password=password
+                password=password_hash
             )
             
             # Generate token
-            token, created = Token.objects.get_or_create(user=user)
+            token, created = await Token.objects.aget_or_create(user=user)
             
-            return Response({
-                'token': token.key,
-                'user': {
-                    'email': user.email,
-                    'name': user.name,
-                    'is_admin': user.is_admin
-                }
-            }, status=status.HTTP_201_CREATED)
+            return JsonResponse(_auth_payload(token, user), status=status.HTTP_201_CREATED)
+        except IntegrityError:
+            # Lost a race with a concurrent registration for the same email
+            return JsonResponse(
+                {'error': 'Email already registered'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         except Exception as e:
-            return Response(
+            return JsonResponse(
                 {'error': str(e)}, 
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-# Rest of the views remain the same
-class LoginView(generics.GenericAPIView):
-    serializer_class = LoginSerializer
 
-    def post(self, request):
-        email = request.data.get('email')
-        password = request.data.get('password')
-        user = authenticate(request, email=email, password=password)
-        if user:
-            token, created = Token.objects.get_or_create(user=user)
-            return Response({'token': token.key, 'user': {'email': user.email, 'name': user.name, 'is_admin': user.is_admin}})
-        return Response({'error': 'Invalid credentials'}, status=status.HTTP_400_BAD_REQUEST)
+
+@method_decorator(csrf_exempt, name='dispatch')
+class LoginView(View):
+    http_method_names = ['post']
+
+    async def post(self, request):
+        data = _request_data(request)
+        if data is None:
+            return JsonResponse({'error': 'Malformed JSON body'}, status=status.HTTP_400_BAD_REQUEST)
+        email = data.get('email')
+        password = data.get('password')
+        try:
+            # The full backend chain: is_active checks, user_login_failed, hash upgrades
+            user = await run_hasher(authenticate, request, email=email, password=password)
+        except HashQueueTimeout:
+            return _hash_pool_busy()
+        if user is not None:
+            token, created = await Token.objects.aget_or_create(user=user)
+            return JsonResponse(_auth_payload(token, user))
+        return JsonResponse({'error': 'Invalid credentials'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def menu_queryset():
+    """Menu items with their total stock (None when untracked) for the sold_out flag, in one query"""
+    return MenuItem.objects.annotate(stock_left=Sum('stock_slots__quantity'))
+
 
 class MenuListView(generics.ListAPIView):
-    queryset = MenuItem.objects.all()
+    queryset = menu_queryset()
     serializer_class = MenuItemSerializer
 
+    def list(self, request, *args, **kwargs):
+        # Served from the versioned menu cache; admin menu changes bump the version
+        payload = get_menu_payload(
+            lambda: self.get_serializer(self.get_queryset(), many=True).data
+        )
+        response = get_conditional_response(
+            request, etag=payload['etag'], last_modified=payload['last_modified']
+        )
+        if response is None:
+            response = Response(payload['data'])
+        response['ETag'] = payload['etag']
+        response['Last-Modified'] = http_date(payload['last_modified'])
+        return response
+
+
+
+def order_list_queryset():
+    """Orders with everything OrderSerializer reads loaded in a fixed number of queries"""
+    return Order.objects.select_related('user').prefetch_related(
+        Prefetch('lines', queryset=OrderLine.objects.select_related('menu_item'))
+    )
 
 
 class OrderListCreateView(generics.ListCreateAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = OrderCursorPagination
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return order_list_queryset().filter(user=self.request.user)
+
+    def create(self, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return super().create(request, *args, **kwargs)
+        return idempotent(request, key, lambda: super(OrderListCreateView, self).create(request, *args, **kwargs))
 
     def perform_create(self, serializer):
-        items_data = self.request.data.get('items_data', [])
-        total_price = self.request.data.get('total_price')
-        if total_price:
-            total_price = Decimal(total_price)
-        else:
-            subtotal = sum(item['price'] * item['quantity'] for item in items_data)
-            delivery_charge = Decimal('50.00')
-            total_price = subtotal + delivery_charge
-        serializer.save(user=self.request.user, total_price=total_price, items_data=items_data)
+        # Priced on the server from the menu price table; client prices and totals are ignored
+        try:
+            quantities = checkout.quantities_from_items_data(self.request.data.get('items_data', []))
+            if not quantities:
+                quantities = {item.id: 1 for item in serializer.validated_data.get('items', [])}
+            items_data, subtotal = checkout.price_lines(quantities)
+            charge = checkout.delivery_charge(
+                serializer.validated_data.get('latitude'), serializer.validated_data.get('longitude')
+            )
+        except checkout.CheckoutError as e:
+            raise ValidationError({'error': str(e)})
+        try:
+            with admission.admit(sum(quantities.values())), transaction.atomic():
+                checkout.take_stock(quantities)
+                order = serializer.save(
+                    user=self.request.user,
+                    total_price=subtotal + charge,
+                    delivery_charge=charge,
+                    items_data=items_data,
+                )
+                lifecycle.orders_created([order])
+        except checkout.CheckoutError as e:
+            raise ValidationError({'error': str(e)})
 
 
 class AdminOrderListView(generics.ListAPIView):
     serializer_class = OrderSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = OrderCursorPagination
 
     def get_queryset(self):
-        return Order.objects.exclude(status='CANCELLED')
+        return order_list_queryset().exclude(status='CANCELLED')
 
 class AdminOrderUpdateView(generics.UpdateAPIView):
     queryset = Order.objects.all()
     serializer_class = AdminOrderSerializer  # Use the new serializer that allows status updates
     permission_classes = [IsAdminUser]
     http_method_names = ['patch']
+    status_fields = {'status', 'version'}
+    item_fields = {'items_ids', 'items_data'}  # Priced, stocked and counted at placement
+
+    def update(self, request, *args, **kwargs):
+        if self.item_fields & set(request.data):
+            return Response(
+                {'error': 'Items cannot be changed once an order is placed; cancel it and place a new one'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if 'status' in request.data and set(request.data) <= self.status_fields:
+            # Status-only patch: one conditional UPDATE, no serializer round trip
+            order = self.change_status(kwargs['pk'], request.data)
+            return Response({'id': order.id, 'status': order.status, 'version': order.version})
+        return super().update(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        new_status = serializer.validated_data.pop('status', None)
+        with transaction.atomic():
+            if new_status is not None and new_status != serializer.instance.status:
+                data = {'status': new_status, 'version': self.request.data.get('version')}
+                order = self.change_status(serializer.instance.id, data)
+                serializer.instance.status, serializer.instance.version = order.status, order.version
+            serializer.save()  # Writes only the other fields, see AdminOrderSerializer.update
+
+    @staticmethod
+    def change_status(order_id, data):
+        """Raises StatusConflict (409) if the transition isn't allowed or `version` is stale"""
+        if data['status'] not in Order.TRANSITIONS:
+            raise ValidationError({'error': f"Unknown status {data['status']!r}"})
+        try:
+            version = int(data['version']) if data.get('version') is not None else None
+        except (TypeError, ValueError):
+            raise ValidationError({'error': 'version must be an integer'})
+        try:
+            return order_status.change_status(order_id, data['status'], expected_version=version)
+        except Order.DoesNotExist:
+            raise NotFound({'error': 'Order not found'})
+
+class AdminOrderBulkStatusView(generics.GenericAPIView):  # One status for many orders in one UPDATE
+    serializer_class = BulkOrderStatusSerializer
+    permission_classes = [IsAdminUser]
+
+    def patch(self, request):
+        serializer = BulkOrderStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = order_status.change_statuses(serializer.validated_data['ids'], serializer.validated_data['status'])
+        return Response({
+            'updated': sum('error' not in result for result in results),
+            'results': results,
+        })
+
 
 class AdminOrderDeleteView(generics.DestroyAPIView):
     queryset = Order.objects.all()
     permission_classes = [IsAdminUser]
 
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            lifecycle.orders_deleted([instance])
+            instance.delete()
+
 class CheckoutUpdateView(generics.UpdateAPIView):
-    serializer_class = OrderSerializer
+    """
+    Lets a customer correct the phone or address of a pending order.
+
+    Items and coordinates are fixed once the order is placed: they decide the
+    price, stock, delivery charge and kitchen load, all settled at checkout.
+    """
+    serializer_class = OrderContactSerializer
     permission_classes = [IsAuthenticated]
     http_method_names = ['patch']
 
     def get_queryset(self):
-        # Allow users to update their own orders
-        # Also check if order status allows checkout (e.g., PENDING status)
         return Order.objects.filter(user=self.request.user, status='PENDING')
-    
-    def get_object(self):
-        # Get the order by pk and verify it belongs to the user
-        queryset = self.get_queryset()
-        obj = generics.get_object_or_404(queryset, pk=self.kwargs.get('pk'))
-        return obj
 
     def update(self, request, *args, **kwargs):
-        kwargs['partial'] = True
-        return super().update(request, *args, **kwargs)
-    
+        fixed = sorted(set(request.data) - set(OrderContactSerializer.Meta.fields))
+        if fixed:
+            return Response(
+                {'error': f"Only phone and location can be changed after checkout, not {', '.join(fixed)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        serializer = self.get_serializer(self.get_object(), data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(OrderSerializer(order_list_queryset().get(pk=serializer.instance.pk)).data)
+
 class CurrentUserView(generics.RetrieveAPIView):
     serializer_class = UserSerializer
     permission_classes = [IsAuthenticated]
@@ -153,30 +329,32 @@ class CurrentUserView(generics.RetrieveAPIView):
         return self.request.user
     
 
-class DownloadOrdersView(generics.GenericAPIView):  # New view for downloading orders as CSV
+class DownloadOrdersView(generics.GenericAPIView):  # Streams orders as CSV or NDJSON
     permission_classes = [IsAdminUser]
+
     def get(self, request):
-        orders = Order.objects.all()  # Get all orders (or filter as needed)
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="orders.csv"'
-        
-        writer = csv.writer(response)
-        writer.writerow(['Order ID', 'User Email','User Name', 'Items', 'Status', 'Total Price', 'Phone', 'Location', 'Created At'])
-        
-        for order in orders:
-            items = ', '.join([item.name for item in order.items.all()])
-            writer.writerow([
-                order.id,
-                order.user.email,
-                order.user.name,
-                items,
-                order.status,
-                order.total_price,
-                order.phone or 'Not provided',
-                order.location or 'Not provided',
-                order.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            ])
-        
+        params = request.query_params
+        # `format` is taken by DRF's renderer override, hence `export_format`
+        export_format = params.get('export_format', 'csv')
+        if export_format not in exports.EXPORT_FORMATS:
+            return Response({'error': 'export_format must be csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            orders = exports.filter_orders(exports.export_queryset(), params)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = exports.csv_rows(orders) if export_format == 'csv' else exports.ndjson_rows(orders)
+        content_type, extension = exports.EXPORT_FORMATS[export_format]
+        filename = f'orders.{extension}'
+        stream = exports.encode(rows)
+        if params.get('gzip') in ('1', 'true'):
+            stream = exports.gzip_stream(stream)
+            content_type, filename = 'application/gzip', f'{filename}.gz'
+        if isinstance(request._request, ASGIRequest):
+            stream = exports.async_stream(stream)
+
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
     
 
@@ -187,19 +365,37 @@ class AdminMenuDeleteView(generics.DestroyAPIView):
 
 
 class AdminMenuListView(generics.ListCreateAPIView):  # Handles adding (POST) and listing (GET) menu items
-    queryset = MenuItem.objects.all()
+    queryset = menu_queryset().order_by('id')
     serializer_class = MenuItemSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = EstimatedCountPagination
 
 
 class AdminMenuUpdateView(generics.UpdateAPIView):
-    queryset = MenuItem.objects.all()
+    queryset = menu_queryset()
     serializer_class = MenuItemSerializer
     permission_classes = [IsAdminUser]
     http_method_names = ['put']
     partial = True  # Allow partial updates
 
 
+class AdminMenuStockView(generics.GenericAPIView):  # GET or PUT an item's stock; null stops tracking it
+    serializer_class = ItemStockSerializer
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk):
+        item = generics.get_object_or_404(MenuItem, pk=pk)
+        stock, slots = inventory.stock_levels([item.id]).get(item.id, (None, 0))
+        return Response({'id': item.id, 'stock': stock, 'slots': slots})
+
+    def put(self, request, pk):
+        item = generics.get_object_or_404(MenuItem, pk=pk)
+        serializer = ItemStockSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        stock, slots = serializer.validated_data['stock'], serializer.validated_data['slots']
+        inventory.set_stock(item.id, stock, slots)
+        return Response({'id': item.id, 'stock': stock, 'slots': slots if stock is not None else 0})
+
 
 class DeliveryStatusView(generics.RetrieveUpdateAPIView):
     serializer_class = DeliveryStatusSerializer
@@ -207,8 +403,202 @@ class DeliveryStatusView(generics.RetrieveUpdateAPIView):
     
     def get_object(self):
         return DeliveryStatus.get_status()
+
+    def retrieve(self, request, *args, **kwargs):
+        # Served from the process-local copy; writes publish a new version (see signals.py)
+        cached = get_delivery_status()
+        etag = f'"{cached["version"]}"'
+        last_modified = cached['updated_at'].timestamp()
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = Response(cached['data'])
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
     
     def get_permissions(self):
         if self.request.method == 'GET':
             return []
-        return [IsAdminUser()]
\ No newline at end of file
+        return [IsAdminUser()]
+
+
+class MetricsView(generics.GenericAPIView):  # Prometheus scrape target for this worker's request metrics
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class SlowQueryLogView(generics.GenericAPIView):  # This worker's most recent slow/sampled queries, newest first
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 50)), 1), settings.SLOW_QUERY_BUFFER_SIZE)
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'enabled': settings.SLOW_QUERY_LOG, 'queries': slow_queries.recent(limit)[::-1]})
+
+
+class ProfileListView(generics.GenericAPIView):  # Stored request profiles, newest first
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({'profiles': profiling.list_profiles()})
+
+
+class ProfileDetailView(generics.GenericAPIView):  # The .prof file, or its top functions with ?report=1
+    permission_classes = [IsAdminUser]
+    SORTS = ('cumulative', 'tottime', 'calls')
+
+    def get(self, request, name):
+        path = profiling.profile_path(name)
+        if path is None:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        if not request.query_params.get('report'):
+            return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{name}.prof')
+        sort = request.query_params.get('sort', 'cumulative')
+        if sort not in self.SORTS:
+            return Response({'error': f"sort must be one of {', '.join(self.SORTS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        return HttpResponse(profiling.report(path, sort), content_type='text/plain; charset=utf-8')
+
+
+class AuthCacheStatsView(generics.GenericAPIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(token_cache_stats())
+
+
+
+class CartView(generics.GenericAPIView):  # GET the cart, PUT to sync the whole cart, DELETE to clear it
+    serializer_class = CartSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(CartSerializer(cart.cart_summary(request.user)).data)
+
+    def put(self, request):
+        serializer = CartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart.sync_cart(request.user, {
+            line['item_id']: line['quantity'] for line in serializer.validated_data['items']
+        })
+        return self.get(request)
+
+    def delete(self, request):
+        cart.clear_cart(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CartItemAddView(generics.GenericAPIView):
+    serializer_class = CartLineSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = CartLineSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if serializer.validated_data['quantity'] < 1:
+            return Response({'quantity': ['Must be at least 1']}, status=status.HTTP_400_BAD_REQUEST)
+        cart.add_to_cart(request.user, serializer.validated_data['item_id'], serializer.validated_data['quantity'])
+        return Response(CartSerializer(cart.cart_summary(request.user)).data, status=status.HTTP_201_CREATED)
+
+
+class CartItemView(generics.GenericAPIView):  # PATCH to set the quantity (0 removes), DELETE to remove
+    serializer_class = CartLineSerializer
+    permission_classes = [IsAuthenticated]
+
+    def patch(self, request, item_id):
+        serializer = CartLineSerializer(data={'item_id': item_id, 'quantity': request.data.get('quantity')})
+        serializer.is_valid(raise_exception=True)
+        cart.set_quantities(request.user, {item_id: serializer.validated_data['quantity']})
+        return Response(CartSerializer(cart.cart_summary(request.user)).data)
+
+    def delete(self, request, item_id):
+        cart.remove_from_cart(request.user, item_id)
+        return Response(CartSerializer(cart.cart_summary(request.user)).data)
+
+
+
+class CartCheckoutView(generics.GenericAPIView):  # Turns the cart into an order, priced on the server
+    serializer_class = CartCheckoutSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = CartCheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            order = checkout.checkout_cart(request.user, **serializer.validated_data)
+        except checkout.CheckoutError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(OrderSerializer(order).data, status=status.HTTP_201_CREATED)
+
+
+class DeliveryQuoteView(generics.GenericAPIView):  # Delivery charge for coordinates, before ordering
+    serializer_class = DeliveryQuoteSerializer
+    permission_classes = [AllowAny]
+
+    def post(self, request):
+        serializer = DeliveryQuoteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        pricing = delivery.get_pricing()
+        if 'points' in data:
+            quotes = pricing.quote_many([(point['latitude'], point['longitude']) for point in data['points']])
+            return Response({'quotes': quotes})
+        return Response(pricing.quote(data['latitude'], data['longitude']))
+
+class DispatchPlanView(generics.GenericAPIView):  # Rider batches and visit order for orders ready to go out
+    permission_classes = [IsAdminUser]
+    statuses = ['ACCEPTED', 'DELIVERYOUT']
+
+    def get(self, request):
+        try:
+            capacity = int(request.query_params.get('capacity', settings.DISPATCH_BATCH_CAPACITY))
+        except ValueError:
+            capacity = 0
+        if capacity < 1:
+            return Response({'error': 'capacity must be a positive integer'}, status=status.HTTP_400_BAD_REQUEST)
+        orders = list(
+            Order.objects.filter(status__in=self.statuses)
+            .order_by('id')
+            .values('id', 'status', 'location', 'phone', 'latitude', 'longitude')
+        )
+        stops = [order for order in orders if order['latitude'] is not None and order['longitude'] is not None]
+        origin = (settings.RESTAURANT_LATITUDE, settings.RESTAURANT_LONGITUDE)
+        return Response({
+            'capacity': capacity,
+            'batches': route_planner.plan_routes(origin, stops, capacity),
+            'without_coordinates': [order['id'] for order in orders if order['latitude'] is None or order['longitude'] is None],
+        })
+
+class KitchenBoardView(generics.GenericAPIView):  # Outstanding units to prepare, from the kitchen counters
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(kitchen.board())
+
+
+class SalesAnalyticsView(generics.GenericAPIView):  # Revenue, status counts and top items from the rollup tables
+    permission_classes = [IsAdminUser]
+    default_days = 30
+
+    def get(self, request):
+        today = timezone.localdate()
+        try:
+            end = self._date(request.query_params.get('to')) or today
+            start = self._date(request.query_params.get('from')) or end - timedelta(days=self.default_days - 1)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end:
+            return Response({'error': "'from' must not be after 'to'"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(analytics.sales_report(start, end))
+
+    @staticmethod
+    def _date(value):
+        if not value:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise ValueError('Dates must be YYYY-MM-DD')
+        return day
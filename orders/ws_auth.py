@@ -0,0 +1,29 @@
+from urllib.parse import parse_qs
+
+from channels.db import database_sync_to_async
+from channels.middleware import BaseMiddleware
+from django.contrib.auth.models import AnonymousUser
+from rest_framework.authtoken.models import Token
+
+
+@database_sync_to_async
+def get_token_user(key):
+    try:
+        token = Token.objects.select_related('user').get(key=key)
+    except Token.DoesNotExist:
+        return AnonymousUser()
+    return token.user if token.user.is_active else AnonymousUser()
+
+
+class TokenAuthMiddleware(BaseMiddleware):
+    """
+    Authenticates WebSocket connections with the same DRF token as the REST API.
+
+    Browsers can't set headers on a WebSocket handshake, so the token is read
+    from the query string: ws/orders/?token=<key>
+    """
+
+    async def __call__(self, scope, receive, send):
+        key = parse_qs(scope.get('query_string', b'').decode()).get('token', [None])[0]
+        scope['user'] = await get_token_user(key) if key else AnonymousUser()
+        return await super().__call__(scope, receive, send)
@@ -15,4 +15,18 @@ from django.core.asgi import get_asgi_application
 settings_module = 'resturant_site.deployment_settings' if 'RENDER_EXTERNAL_HOSTNAME' in os.environ else 'resturant_site.settings'
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', settings_module)
 
-application = get_asgi_application()
+# Initialise Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+
+from orders.routing import websocket_urlpatterns  # noqa: E402
+from orders.ws_auth import TokenAuthMiddleware  # noqa: E402
+
+application = ProtocolTypeRouter({
+    'http': django_asgi_app,
+    'websocket': AllowedHostsOriginValidator(
+        TokenAuthMiddleware(URLRouter(websocket_urlpatterns))
+    ),
+})
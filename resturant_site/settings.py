@@ -50,6 +50,7 @@ INSTALLED_APPS = [
     'rest_framework',
     'rest_framework.authtoken',
     'corsheaders',
+    'channels',
     
     # Local apps
     'orders',
@@ -59,6 +60,7 @@ INSTALLED_APPS = [
 # MIDDLEWARE
 # -------------------
 MIDDLEWARE = [
+    'orders.middleware.RequestMetricsMiddleware',  # Outermost, so it times everything below
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -67,6 +69,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'orders.middleware.ProfilingMiddleware',  # Innermost, so profiles show the view (orders/profiling.py)
 ]
 
 # -------------------
@@ -91,6 +94,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'resturant_site.wsgi.application'
+ASGI_APPLICATION = 'resturant_site.asgi.application'
 
 # -------------------
 # DATABASE (Dev: SQLite fallback)
@@ -112,6 +116,91 @@ else:
         }
     }
 
+# -------------------
+# CACHE (Redis when REDIS_URL is set, so invalidation reaches every worker)
+# -------------------
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+        # Eviction is bounded by the Redis server's maxmemory / maxmemory-policy
+        "idempotency": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "idempotency",
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "resturant-site",
+        },
+        "idempotency": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "resturant-site-idempotency",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        },
+    }
+
+MENU_CACHE_TIMEOUT = config('MENU_CACHE_TIMEOUT', default=60 * 60, cast=int)
+KITCHEN_RECONCILE_INTERVAL = config('KITCHEN_RECONCILE_INTERVAL', default=5 * 60, cast=int)  # orders/kitchen.py
+ORDER_RETENTION_DAYS = config('ORDER_RETENTION_DAYS', default=180, cast=int)  # archive_orders command
+
+# Kitchen admission control (orders/admission.py); a cap of 0 disables that check
+ADMISSION_MAX_ORDERS = config('ADMISSION_MAX_ORDERS', default=50, cast=int)
+ADMISSION_MAX_UNITS = config('ADMISSION_MAX_UNITS', default=300, cast=int)
+ADMISSION_RESUME_RATIO = config('ADMISSION_RESUME_RATIO', default=0.8, cast=float)
+ADMISSION_RETRY_AFTER = config('ADMISSION_RETRY_AFTER', default=120, cast=int)
+
+# Idempotency-Key replay window for POST /api/orders/ (orders/idempotency.py)
+IDEMPOTENCY_TTL = config('IDEMPOTENCY_TTL', default=10 * 60, cast=int)
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=30, cast=int)
+IDEMPOTENCY_LOCK_WAIT = config('IDEMPOTENCY_LOCK_WAIT', default=10, cast=int)
+
+# Delivery pricing (orders/delivery.py): tiers are "max_km:charge", the zone an optional "lat,lng;..." polygon
+RESTAURANT_LATITUDE = config('RESTAURANT_LATITUDE', default=27.7172, cast=float)
+RESTAURANT_LONGITUDE = config('RESTAURANT_LONGITUDE', default=85.3240, cast=float)
+DELIVERY_TIERS = config('DELIVERY_TIERS', default='3:50,6:80,10:120')
+DELIVERY_ZONE = config('DELIVERY_ZONE', default='')
+DISPATCH_BATCH_CAPACITY = config('DISPATCH_BATCH_CAPACITY', default=5, cast=int)  # Orders per rider trip
+
+# Slow-query log (orders/slow_queries.py); off unless SLOW_QUERY_LOG is set
+SLOW_QUERY_LOG = config('SLOW_QUERY_LOG', default=False, cast=bool)
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=200, cast=float)
+SLOW_QUERY_SAMPLE_RATE = config('SLOW_QUERY_SAMPLE_RATE', default=0.0, cast=float)  # Share of fast queries logged too
+SLOW_QUERY_EXPLAIN = config('SLOW_QUERY_EXPLAIN', default=True, cast=bool)
+SLOW_QUERY_EXPLAIN_INTERVAL = config('SLOW_QUERY_EXPLAIN_INTERVAL', default=5 * 60, cast=int)  # Per fingerprint
+SLOW_QUERY_BUFFER_SIZE = config('SLOW_QUERY_BUFFER_SIZE', default=500, cast=int)
+SLOW_QUERY_LOG_FILE = config('SLOW_QUERY_LOG_FILE', default=str(BASE_DIR / 'logs' / 'slow_queries.jsonl'))
+SLOW_QUERY_LOG_MAX_BYTES = config('SLOW_QUERY_LOG_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+SLOW_QUERY_LOG_BACKUPS = config('SLOW_QUERY_LOG_BACKUPS', default=5, cast=int)
+
+# On-demand request profiling for admins (orders/profiling.py): send X-Profile: 1 or ?_profile=1
+PROFILE_REQUESTS = config('PROFILE_REQUESTS', default=True, cast=bool)
+PROFILE_MIN_INTERVAL = config('PROFILE_MIN_INTERVAL', default=60, cast=int)  # Seconds between profiled requests
+PROFILE_DIR = config('PROFILE_DIR', default=str(BASE_DIR / 'profiles'))
+PROFILE_KEEP = config('PROFILE_KEEP', default=50, cast=int)
+
+# -------------------
+# CHANNEL LAYER (order events pushed over ws/orders/)
+# -------------------
+if REDIS_URL:
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "channels_redis.core.RedisChannelLayer",
+            "CONFIG": {"hosts": [REDIS_URL]},
+        }
+    }
+else:
+    # Single-process only: fine for development and tests
+    CHANNEL_LAYERS = {
+        "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}
+    }
+
 # -------------------
 # PASSWORD VALIDATION
 # -------------------
@@ -122,6 +211,10 @@ AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator'},
 ]
 
+# Password hashing runs on a bounded pool (orders/hashing.py) for register / login
+AUTH_HASH_CONCURRENCY = config('AUTH_HASH_CONCURRENCY', default=2, cast=int)
+AUTH_HASH_QUEUE_TIMEOUT = config('AUTH_HASH_QUEUE_TIMEOUT', default=5, cast=int)
+
 # -------------------
 # INTERNATIONALIZATION
 # -------------------
@@ -138,7 +231,7 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = []
 
 # Whitenoise for production-ready static serving
-MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+MIDDLEWARE.insert(2, 'orders.middleware.AsyncWhiteNoiseMiddleware')  # Async-capable WhiteNoise, see orders/middleware.py
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # Cloudinary media storage
@@ -167,9 +260,15 @@ if all([CLOUDINARY_STORAGE['CLOUD_NAME'], CLOUDINARY_STORAGE['API_KEY'], CLOUDIN
 # REST FRAMEWORK & CORS
 # -------------------
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': ['rest_framework.authentication.TokenAuthentication'],
+    'DEFAULT_AUTHENTICATION_CLASSES': ['orders.authentication.CachedTokenAuthentication'],
 }
 
+# Token lookups: per-process LRU, then the shared cache alias (if any), then the DB
+TOKEN_AUTH_CACHE_SIZE = config('TOKEN_AUTH_CACHE_SIZE', default=10000, cast=int)
+TOKEN_AUTH_CACHE_TTL = config('TOKEN_AUTH_CACHE_TTL', default=30, cast=int)
+TOKEN_AUTH_SHARED_CACHE = config('TOKEN_AUTH_SHARED_CACHE', default='default' if REDIS_URL else '')
+TOKEN_AUTH_SHARED_TTL = config('TOKEN_AUTH_SHARED_TTL', default=300, cast=int)
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOWED_ORIGINS = ['http://localhost:5173']
 